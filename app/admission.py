@@ -0,0 +1,198 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# Per-user rate: a token bucket refilled at CHAT_RATE_PER_MINUTE holding up
+# to CHAT_BURST requests. A rate of 0 disables per-user limiting.
+CHAT_RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", "20"))
+CHAT_BURST = int(os.getenv("CHAT_BURST", "5"))
+# Users whose buckets are remembered; the least recently seen are dropped.
+CHAT_RATE_TRACKED_USERS = int(os.getenv("CHAT_RATE_TRACKED_USERS", "10000"))
+
+# Chat turns in flight at once, how many more may wait for a slot, and for
+# how long before being turned away.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "128"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "256"))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "5"))
+
+# Weight of the newest sample in the moving averages of service and wait time.
+_EWMA_ALPHA = 0.1
+
+# --- Rate Limiting --------------------------------------------------------
+
+class TokenBucket:
+    """
+    Allows `capacity` requests at once and `rate` per second sustained.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """
+        Take a token; returns 0 on success, otherwise the seconds until one
+        is available.
+        """
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def give_back(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+# --- Admission ------------------------------------------------------------
+
+class Ticket:
+    """
+    An admitted request's concurrency slot; release it when the request,
+    including any streamed response, is finished. Releasing twice is a no-op.
+    """
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._started)
+
+
+class AdmissionController:
+    """
+    Admission in front of the chat endpoints: a token bucket per user, a cap
+    on turns in flight and a bounded FIFO queue for the next ones. Requests
+    over their user's rate get 429, requests that find the queue full or
+    wait too long in it get 503, both with Retry-After, so admitted requests
+    are not slowed down by a backlog.
+    """
+
+    def __init__(self, rate_per_minute: float = CHAT_RATE_PER_MINUTE, burst: int = CHAT_BURST,
+                 max_concurrency: int = CHAT_MAX_CONCURRENCY, max_queue: int = CHAT_MAX_QUEUE,
+                 queue_timeout: float = CHAT_QUEUE_TIMEOUT_SECONDS,
+                 tracked_users: int = CHAT_RATE_TRACKED_USERS):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tracked_users = tracked_users
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rate_limited = 0
+        self.queue_full = 0
+        self.queue_timeouts = 0
+        self._service_time = 0.0
+        self._queue_wait = 0.0
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.tracked_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def _retry_after_busy(self) -> int:
+        """
+        Seconds until the queue ahead has likely drained.
+        """
+        service = self._service_time or self.queue_timeout
+        return max(1, math.ceil(service * (self.waiting + 1) / self.max_concurrency))
+
+    def _release(self, seconds: float):
+        self.active -= 1
+        self._service_time += _EWMA_ALPHA * (seconds - self._service_time) if self._service_time else seconds
+        self._slots.release()
+
+    async def acquire(self, user_id: str) -> Ticket:
+        """
+        Admit a request from `user_id` or raise HTTPException 429/503.
+        """
+        bucket = None
+        if self.rate > 0:
+            bucket = self._bucket(user_id)
+            wait = bucket.take()
+            if wait:
+                self.rate_limited += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many messages, please slow down",
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.queue_full += 1
+                if bucket is not None:
+                    bucket.give_back()
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server busy, please retry shortly",
+                    headers={"Retry-After": str(self._retry_after_busy())},
+                )
+            self.queued += 1
+
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            if bucket is not None:
+                bucket.give_back()
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": str(self._retry_after_busy())},
+            )
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self._queue_wait += _EWMA_ALPHA * (waited - self._queue_wait)
+
+        self.active += 1
+        self.admitted += 1
+        return Ticket(self)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_rate_limited": self.rate_limited,
+            "rejected_queue_full": self.queue_full,
+            "rejected_queue_timeout": self.queue_timeouts,
+            "avg_service_ms": round(self._service_time * 1000, 1),
+            "avg_queue_wait_ms": round(self._queue_wait * 1000, 1),
+            "tracked_users": len(self._buckets),
+        }
@@ -0,0 +1,126 @@
+import os
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import ChatSession
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# Histories up to this many messages are deleted within the request; larger
+# ones are handed to the background purge.
+CLEAR_HISTORY_INLINE_MESSAGES = int(os.getenv("CLEAR_HISTORY_INLINE_MESSAGES", "5000"))
+# Sessions deleted per purge transaction, messages cascading with them.
+PURGE_BATCH_SESSIONS = int(os.getenv("PURGE_BATCH_SESSIONS", "200"))
+
+# Prefix put on the user_id of sessions handed to the purge. Every read
+# matches sessions by owner, so they are gone for the user at once; the
+# purge finds them by their purge_pending flag.
+PURGE_OWNER_PREFIX = "purge:"
+
+# --- Clearing -------------------------------------------------------------
+
+async def clear_user_history(db: AsyncSession, user_id: str) -> dict:
+    """
+    Delete all of a user's sessions with set-based statements; the
+    database's ON DELETE CASCADE removes their messages. Large histories are
+    only handed over to the purge here; `background` says so.
+    """
+    res = await db.execute(
+        select(func.count(), func.coalesce(func.sum(ChatSession.message_count), 0))
+        .where(ChatSession.user_id == user_id)
+    )
+    sessions, messages = res.one()
+    if not sessions:
+        return {"sessions": 0, "messages": 0, "background": False}
+
+    background = messages > CLEAR_HISTORY_INLINE_MESSAGES
+    if background:
+        stmt = (
+            update(ChatSession)
+            .where(ChatSession.user_id == user_id)
+            .values(user_id=PURGE_OWNER_PREFIX + user_id, purge_pending=True)
+        )
+    else:
+        stmt = delete(ChatSession).where(ChatSession.user_id == user_id)
+    await db.execute(stmt.execution_options(synchronize_session=False))
+    await db.commit()
+    return {"sessions": sessions, "messages": messages, "background": background}
+
+# --- Background Purge -----------------------------------------------------
+
+class HistoryPurger:
+    """
+    Deletes the sessions `clear_user_history` handed over, a batch per
+    transaction, so no single statement holds locks for the whole history.
+    `kick` after handing sessions over and once at startup, which resumes a
+    purge cut short by a restart.
+    """
+
+    def __init__(self, batch_sessions: int = PURGE_BATCH_SESSIONS):
+        self.batch_sessions = batch_sessions
+        self._task: Optional[asyncio.Task] = None
+        self._again = False
+        self.purged_sessions = 0
+        self.batches = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def kick(self):
+        if self.running:
+            # sessions handed over after the running purge's last batch query
+            self._again = True
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._again = False
+            try:
+                await self._purge()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"History purge error: {e}")
+                return
+            if not self._again:
+                return
+
+    async def _purge(self):
+        while True:
+            async with AsyncSessionLocal() as db:
+                ids = (await db.execute(
+                    select(ChatSession.id)
+                    .where(ChatSession.purge_pending.is_(True))
+                    .limit(self.batch_sessions)
+                )).scalars().all()
+                if not ids:
+                    return
+                await db.execute(
+                    delete(ChatSession).where(ChatSession.id.in_(ids))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            self.purged_sessions += len(ids)
+            self.batches += 1
+            logger.info("Purged %d cleared sessions", len(ids))
+
+    async def aclose(self):
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "purged_sessions": self.purged_sessions,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
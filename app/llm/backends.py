@@ -0,0 +1,283 @@
+import os
+import re
+import math
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, List, Dict, NamedTuple, Optional
+
+import httpx
+from groq import AsyncGroq, APIError, APITimeoutError
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# "groq" talks to the Groq API; "stub" answers locally, for load tests.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemma-7b-it")
+# Point the Groq client elsewhere, e.g. at scripts/llm_stub_server.py.
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+# Keep-alive connections to the provider shared by all calls.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+# Stub behaviour: time to first token as "<dist>:<args>" in milliseconds
+# ("constant:600", "uniform:300:900", "lognormal:600:0.5" = median, sigma),
+# streaming rate, and the share of calls that fail.
+LLM_STUB_LATENCY = os.getenv("LLM_STUB_LATENCY", "lognormal:600:0.5")
+LLM_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "400"))
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+LLM_STUB_SEED = os.getenv("LLM_STUB_SEED")
+
+# --- Interface ------------------------------------------------------------
+
+class LLMError(Exception):
+    """
+    The backend could not produce a completion.
+    """
+
+
+class LLMTimeoutError(LLMError):
+    """
+    The backend gave up waiting for the provider.
+    """
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class StreamUsage:
+    """
+    Token usage of a streamed completion, filled in by `stream` when the
+    provider reports it with the last chunk.
+    """
+
+    __slots__ = ("prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+class LLMBackend:
+    """
+    A chat-completion provider. `complete` returns the whole reply with its
+    token usage; `stream` yields the reply text in pieces as it is produced
+    and records its usage in `usage`, if given. Provider failures surface as
+    LLMError / LLMTimeoutError.
+    """
+
+    name = "base"
+    model = LLM_MODEL
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = 1024,
+                       temperature: float = 0.0, top_p: float = 0.9) -> Completion:
+        raise NotImplementedError
+
+    def stream(self, messages: List[Dict[str, str]], max_tokens: int = 1024,
+               temperature: float = 0.0, top_p: float = 0.9,
+               usage: Optional[StreamUsage] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+# --- Groq -----------------------------------------------------------------
+
+class GroqBackend(LLMBackend):
+    """
+    Groq chat completions over a shared keep-alive connection pool.
+    """
+
+    name = "groq"
+
+    def __init__(self, api_key: Optional[str] = None, model: str = LLM_MODEL,
+                 base_url: Optional[str] = GROQ_BASE_URL):
+        self.model = model
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+        )
+        self.client = AsyncGroq(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=LLM_MAX_RETRIES,
+        )
+
+    async def complete(self, messages, max_tokens=1024, temperature=0.0, top_p=0.9) -> Completion:
+        try:
+            chat_completion = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p,
+            )
+        except APITimeoutError as e:
+            raise LLMTimeoutError(str(e)) from e
+        except APIError as e:
+            raise LLMError(str(e)) from e
+
+        usage = chat_completion.usage
+        return Completion(
+            chat_completion.choices[0].message.content,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+    async def stream(self, messages, max_tokens=1024, temperature=0.0, top_p=0.9, usage=None):
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p,
+                stream=True,
+                # usage comes with the last chunk only when asked for
+                extra_body={"stream_options": {"include_usage": True}},
+            )
+            try:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+                    reported = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None)
+                    if reported and usage is not None:
+                        usage.prompt_tokens = reported.prompt_tokens
+                        usage.completion_tokens = reported.completion_tokens
+            finally:
+                await stream.close()
+        except APITimeoutError as e:
+            raise LLMTimeoutError(str(e)) from e
+        except APIError as e:
+            raise LLMError(str(e)) from e
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+# --- Stub -----------------------------------------------------------------
+
+STUB_STEPS = [
+    "Scan the engine computer for stored trouble codes and note any pending codes.",
+    "Inspect the {part} for wear, leaks, cracks or loose connections.",
+    "Check the related fuses, relays and wiring harness connectors for corrosion.",
+    "Compare sensor readings against the factory specifications for the {vehicle}.",
+    "Clear the codes, road test the vehicle and confirm whether the symptom returns.",
+    "If the fault persists, have the {part} tested and replaced by a qualified mechanic.",
+]
+
+_WORD_RE = re.compile(r"\S+\s*")
+
+
+def _parse_latency(spec: str):
+    """
+    Parse a latency spec into a sampler returning seconds.
+    """
+    kind, *args = spec.split(":")
+    if kind == "constant":
+        seconds = float(args[0]) / 1000
+        return lambda rng: seconds
+    if kind == "uniform":
+        low, high = float(args[0]) / 1000, float(args[1]) / 1000
+        return lambda rng: rng.uniform(low, high)
+    if kind == "lognormal":
+        median = float(args[0]) / 1000
+        sigma = float(args[1]) if len(args) > 1 else 0.5
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubBackend(LLMBackend):
+    """
+    Local stand-in for the provider: answers after a latency drawn from a
+    configurable distribution, streams at a fixed token rate and fails a
+    configurable share of calls. Replies are plausible numbered diagnoses
+    built from the conversation, with no network or API quota involved.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: str = LLM_STUB_LATENCY,
+                 tokens_per_second: float = LLM_STUB_TOKENS_PER_SECOND,
+                 error_rate: float = LLM_STUB_ERROR_RATE,
+                 seed: Optional[int] = int(LLM_STUB_SEED) if LLM_STUB_SEED else None,
+                 model: str = "stub"):
+        self.model = model
+        self.latency_spec = latency
+        self._latency = _parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    def _reply(self, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        vehicle = "vehicle"
+        for m in messages:
+            if m["role"] == "system" and m["content"].startswith("Current Vehicle:"):
+                vehicle = m["content"].split("\n", 1)[0][len("Current Vehicle:"):].strip()
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        words = re.findall(r"[a-z]{4,}", question.lower())
+        part = words[-1] if words else "component"
+        steps = [s.format(part=part, vehicle=vehicle) for s in STUB_STEPS]
+        text = f"Based on your description of the {vehicle}, here is how to diagnose it:\n" + "\n".join(
+            f"{i}. {s}" for i, s in enumerate(steps, 1)
+        )
+        pieces = _WORD_RE.findall(text)
+        return "".join(pieces[:max_tokens])
+
+    async def _first_token(self):
+        await asyncio.sleep(self._latency(self._rng))
+        if self._rng.random() < self.error_rate:
+            raise LLMError("stub backend: injected failure")
+
+    async def complete(self, messages, max_tokens=1024, temperature=0.0, top_p=0.9) -> Completion:
+        await self._first_token()
+        text = self._reply(messages, max_tokens)
+        tokens = len(_WORD_RE.findall(text))
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(tokens / self.tokens_per_second)
+        prompt_tokens = sum(len(_WORD_RE.findall(m["content"])) for m in messages)
+        return Completion(text, prompt_tokens, tokens)
+
+    async def stream(self, messages, max_tokens=1024, temperature=0.0, top_p=0.9, usage=None):
+        await self._first_token()
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        pieces = _WORD_RE.findall(self._reply(messages, max_tokens))
+        for piece in pieces:
+            yield piece
+            if delay:
+                await asyncio.sleep(delay)
+        if usage is not None:
+            usage.prompt_tokens = sum(len(_WORD_RE.findall(m["content"])) for m in messages)
+            usage.completion_tokens = len(pieces)
+
+
+def make_backend(name: str = LLM_BACKEND) -> LLMBackend:
+    """
+    The backend selected by LLM_BACKEND.
+    """
+    if name == "stub":
+        backend = StubBackend()
+        logger.info(
+            "Using stub LLM backend (latency %s, %.0f tokens/s, error rate %.2f)",
+            backend.latency_spec, backend.tokens_per_second, backend.error_rate,
+        )
+        return backend
+    if name == "groq":
+        api_key = os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            logger.warning("GROQ_API_KEY not found in environment variables")
+        return GroqBackend(api_key=api_key)
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+DIAGNOSIS_CACHE_SIZE = int(os.getenv("DIAGNOSIS_CACHE_SIZE", "2048"))
+DIAGNOSIS_CACHE_TTL_SECONDS = float(os.getenv("DIAGNOSIS_CACHE_TTL_SECONDS", str(24 * 3600)))
+# SQLite file for the persistent tier; unset keeps the cache in memory only.
+DIAGNOSIS_CACHE_PATH = os.getenv("DIAGNOSIS_CACHE_PATH") or None
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s.!?,;:]+$")
+
+# --- Keys -----------------------------------------------------------------
+
+def _normalize(text: str) -> str:
+    return _TRAILING_PUNCT_RE.sub("", _WHITESPACE_RE.sub(" ", text.lower()).strip())
+
+
+def diagnosis_key(model: str, messages: List[Dict[str, str]]) -> str:
+    """
+    Cache key for a completion: the model and every message of the prompt
+    sent to it (system prompt, vehicle, grounding, summary and turns), case,
+    whitespace and trailing punctuation folded.
+    """
+    payload = {
+        "model": model,
+        "messages": [[m["role"], _normalize(m["content"])] for m in messages],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+# --- Persistent Tier ------------------------------------------------------
+
+class _SQLiteTier:
+    """
+    Key/value table in a local SQLite file, used from worker threads.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS diagnosis_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM diagnosis_cache WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM diagnosis_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row
+
+    def put(self, key: str, value: str, expires_at: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO diagnosis_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM diagnosis_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# --- Cache ----------------------------------------------------------------
+
+class DiagnosisCache:
+    """
+    LRU cache of diagnosis replies with a time-to-live, backed by an optional
+    SQLite tier so entries survive restarts. Memory misses fall through to the
+    persistent tier and are promoted on a hit.
+    """
+
+    def __init__(self, max_entries: int = DIAGNOSIS_CACHE_SIZE,
+                 ttl_seconds: float = DIAGNOSIS_CACHE_TTL_SECONDS,
+                 path: Optional[str] = DIAGNOSIS_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._tier = _SQLiteTier(path) if path else None
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self._tier is not None:
+            try:
+                row = await asyncio.to_thread(self._tier.get, key)
+            except sqlite3.Error as e:
+                logger.error(f"Diagnosis cache read error: {e}")
+                row = None
+            if row is not None:
+                self._remember(key, *row)
+                self.hits += 1
+                self.persistent_hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: str):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self._tier is not None:
+            try:
+                await asyncio.to_thread(self._tier.put, key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.error(f"Diagnosis cache write error: {e}")
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        if self._tier is not None:
+            self._tier.clear()
+
+    def close(self):
+        if self._tier is not None:
+            self._tier.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "persistent": self._tier is not None,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
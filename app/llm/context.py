@@ -0,0 +1,94 @@
+import os
+import re
+from typing import NamedTuple, Optional, List, Dict
+
+# --- Configuration --------------------------------------------------------
+
+# Tokens the conversation (summary + turns + new message) may use in a prompt;
+# the system prompt and vehicle context come on top.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Most recent messages kept verbatim when the conversation outgrows the
+# budget; the older ones are then folded into the session summary together.
+CONTEXT_KEEP_MESSAGES = int(os.getenv("CONTEXT_KEEP_MESSAGES", "6"))
+
+# Per-message overhead of the chat format (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# Product lists appended to replies before products moved to their own field.
+_LEGACY_PRODUCTS_RE = re.compile(r"\n*\*\*Recommended Products:\*\*.*\Z", re.S)
+
+# --- Helpers --------------------------------------------------------------
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the tokens in `text` at about four characters per token, which
+    holds well enough for English with the Llama/Gemma tokenizers.
+    """
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def clean_content(content: str) -> str:
+    """
+    Message content as it should be replayed to the LLM.
+    """
+    return _LEGACY_PRODUCTS_RE.sub("", content)
+
+# --- Context Builder ------------------------------------------------------
+
+class ConversationContext(NamedTuple):
+    # prompt messages: summary (if any), recent turns, the new user message
+    messages: List[Dict[str, str]]
+    tokens: int
+    # stored messages old enough to be folded into the summary
+    to_summarize: list
+
+
+def build_context(history: list, new_message: str, summary: Optional[str] = None,
+                  summarized_through: Optional[int] = None,
+                  budget: int = CONTEXT_TOKEN_BUDGET,
+                  keep_messages: int = CONTEXT_KEEP_MESSAGES) -> ConversationContext:
+    """
+    Assemble the conversation for a new user message from the stored
+    `history` (Message rows, oldest first) and the session's rolling summary,
+    which covers every message up to id `summarized_through`.
+
+    Messages the summary does not cover yet are replayed verbatim, newest
+    first, until the budget is spent; the new message and the summary always
+    go in. Only once they no longer all fit, the older unsummarized messages
+    are returned in `to_summarize`, so the caller folds them in as one batch
+    rather than one message per turn. At most `keep_messages` stay out of
+    it, and only as many as fit in half the budget, so the following turns
+    fit again until the conversation has grown by that much.
+    """
+    pending = [m for m in history if summarized_through is None or m.id > summarized_through]
+
+    head = [{"role": "system", "content": SUMMARY_PREFIX + summary}] if summary else []
+    tail = [{"role": "user", "content": new_message}]
+    used = fixed = sum(message_tokens(m) for m in head + tail)
+
+    turns = []
+    for m in reversed(pending):
+        turn = {"role": m.role, "content": clean_content(m.content)}
+        cost = message_tokens(turn)
+        if used + cost > budget:
+            break
+        turns.append(turn)
+        used += cost
+    turns.reverse()
+
+    to_summarize = []
+    if len(turns) < len(pending):
+        keep, room = 0, budget // 2 - fixed
+        for turn in reversed(turns[-keep_messages:] if keep_messages else []):
+            room -= message_tokens(turn)
+            if room < 0:
+                break
+            keep += 1
+        to_summarize = pending[:len(pending) - keep]
+    return ConversationContext(head + turns + tail, used, to_summarize)
@@ -1,10 +1,20 @@
 import os
 import re
+import time
+import asyncio
 import logging
 import traceback
-from typing import List, Dict
-from groq import Groq
+from typing import AsyncIterator, List, Dict, Optional
+
 from app.models import ChatSession
+from app.llm.backends import (
+    LLMBackend, LLMError, LLMTimeoutError, StreamUsage, make_backend, LLM_TIMEOUT_SECONDS,
+)
+from app.llm.cache import DiagnosisCache, diagnosis_key
+from app.llm.singleflight import SingleFlight, FlightAbandoned
+from app.llm.resilience import CircuitBreaker, CircuitOpenError, Hedger
+from app.llm.known_issues import KnownIssuesIndex, describe, grounding_prompt, known_issues_reply
+from app.metrics import REGISTRY, TOKEN_BUCKETS
 
 # Configure logging
 logging.basicConfig(
@@ -17,40 +27,185 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --- Configuration --------------------------------------------------------
+
+# Completions allowed in flight at once; further calls wait for a slot.
+# LLM_TIMEOUT_SECONDS (app/llm/backends.py) bounds each call, waiting included.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+SUMMARY_MAX_TOKENS = 300
+
+TIMEOUT_REPLY = "The diagnosis service is taking too long to respond. Please try again in a moment."
+UNAVAILABLE_REPLY = "The diagnosis service is temporarily unavailable. Please try again in a minute."
+
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "llm_call_duration_seconds", "Time per LLM call, waiting for a slot included",
+    ("call", "outcome"),
+)
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "llm_first_token_seconds", "Time to the first streamed token of an LLM call",
+)
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "llm_prompt_tokens", "Prompt tokens per completion", buckets=TOKEN_BUCKETS,
+)
+LLM_COMPLETION_TOKENS = REGISTRY.histogram(
+    "llm_completion_tokens", "Completion tokens per completion", buckets=TOKEN_BUCKETS,
+)
+
 class DiagnoseLLM:
-    def __init__(self):
+    def __init__(self, backend: Optional[LLMBackend] = None):
         """
-        Initialize the DiagnoseLLM class and Groq client.
+        Initialize the DiagnoseLLM class with a completion backend (Groq by
+        default, see LLM_BACKEND).
         """
+        self.semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        # temperature 0 makes replies repeatable, so identical conversations share one
+        self.cache = DiagnosisCache()
+        # identical requests already in flight share one upstream call
+        self.flights = SingleFlight()
+        # fail fast while the provider is erroring; hedge slow calls
+        self.breaker = CircuitBreaker()
+        self.hedger = Hedger()
+        self.local_answers = 0
+        self.grounded_prompts = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+        # System prompt with strict automotive focus
+        self.system_prompt = (
+            "You are AutoGenius, an expert automotive diagnostic assistant. "
+            "Your ONLY purpose is to help diagnose and repair vehicles. "
+            "Rules you MUST follow:\n"
+            "1. Always remember and reference the specific vehicle being discussed\n"
+            "2. Only respond to automotive-related questions\n"
+            "3. Reject all other topics with: \"I specialize in automotive diagnostics only\"\n"
+            "4. Be technical but clear in explanations\n"
+            "5. Provide concise, numbered steps when appropriate\n"
+            "6. Never use special formatting or characters (e.g., **, *, etc.)\n"
+            "7. Use numbered lists (e.g., 1., 2., etc.) for bullet points\n"
+            "8. When asked about the vehicle, always respond with its full details\n"
+            "10. Don't give recommended products everytime when you response. Give when user say recommend me"
+            "9. If someone asks about who created you, tell them: \"I am AutoGenius, an expert automotive diagnostic assistant built by Zia Ul Din, a data analyst and AI developer currently pursuing a BS in Business Analytics at International Islamic University Islamabad. Zia specializes in data analytics, machine learning, NLP, and AI-driven solutions, with hands-on experience developing predictive models, interactive dashboards, and chatbots using Python, SQL, Power BI, Flask, Gradio, and LLMs. His notable projects include AI Auto Workshop (AI-powered vehicle diagnostics and repair cost estimation), geospatial market analysis, and AI voice chatbot applications.\"\n"
+        )
+
+        # known issues per vehicle from data/car_issues_db.json
         try:
-            groq_api_key = os.environ.get("GROQ_API_KEY")
-            if not groq_api_key:
-                logger.warning("GROQ_API_KEY not found in environment variables")
-            
-            self.client = Groq(api_key=groq_api_key)
-            logger.info("Groq client initialized successfully")
-            
-            # System prompt with strict automotive focus
-            self.system_prompt = (
-                "You are AutoGenius, an expert automotive diagnostic assistant. "
-                "Your ONLY purpose is to help diagnose and repair vehicles. "
-                "Rules you MUST follow:\n"
-                "1. Always remember and reference the specific vehicle being discussed\n"
-                "2. Only respond to automotive-related questions\n"
-                "3. Reject all other topics with: \"I specialize in automotive diagnostics only\"\n"
-                "4. Be technical but clear in explanations\n"
-                "5. Provide concise, numbered steps when appropriate\n"
-                "6. Never use special formatting or characters (e.g., **, *, etc.)\n"
-                "7. Use numbered lists (e.g., 1., 2., etc.) for bullet points\n"
-                "8. When asked about the vehicle, always respond with its full details\n"
-                "10. Don't give recommended products everytime when you response. Give when user say recommend me"
-                "9. If someone asks about who created you, tell them: \"I am AutoGenius, an expert automotive diagnostic assistant built by Zia Ul Din, a data analyst and AI developer currently pursuing a BS in Business Analytics at International Islamic University Islamabad. Zia specializes in data analytics, machine learning, NLP, and AI-driven solutions, with hands-on experience developing predictive models, interactive dashboards, and chatbots using Python, SQL, Power BI, Flask, Gradio, and LLMs. His notable projects include AI Auto Workshop (AI-powered vehicle diagnostics and repair cost estimation), geospatial market analysis, and AI voice chatbot applications.\"\n"
+            self.known_issues = KnownIssuesIndex.load()
+        except Exception as e:
+            logger.error(f"Error loading known issues: {str(e)}")
+            self.known_issues = KnownIssuesIndex.empty()
+
+        try:
+            self.backend = backend or make_backend()
+            logger.info(
+                "LLM backend %s initialized (model %s, max concurrency %d, timeout %.1fs)",
+                self.backend.name, self.backend.model, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS,
             )
-            
         except Exception as e:
-            logger.error(f"Error initializing Groq client: {str(e)}")
+            logger.error(f"Error initializing LLM backend: {str(e)}")
             logger.error(traceback.format_exc())
-            self.client = None
+            self.backend = None
+
+    async def aclose(self):
+        """
+        Close the backend's connections.
+        """
+        if self.backend is not None:
+            await self.backend.aclose()
+        self.cache.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "model": self.backend.model if self.backend else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache": self.cache.stats(),
+            "single_flight": self.flights.stats(),
+            "circuit_breaker": self.breaker.stats(),
+            "hedging": self.hedger.stats(),
+            "known_issues": {"local_answers": self.local_answers, "grounded_prompts": self.grounded_prompts},
+        }
+
+    async def _generate(self, cache_key: str, messages: List[Dict[str, str]]) -> str:
+        response = await self._complete(messages)
+
+        # Remove any special formatting (like **)
+        response = re.sub(r'\*\*', '', response)
+        await self.cache.put(cache_key, response)
+        return response
+
+    def _cache_key(self, llm_messages: List[Dict[str, str]]) -> str:
+        return diagnosis_key(self.backend.model, llm_messages)
+
+    async def _complete(self, messages: List[Dict[str, str]], max_tokens: int = 1024) -> str:
+        """
+        One chat completion, bounded by the concurrency limit and the call
+        timeout, guarded by the circuit breaker and hedged when slow.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuit open")
+
+        async def attempt():
+            async with self.semaphore:
+                started = time.monotonic()
+                completion = await self.backend.complete(
+                    messages, max_tokens=max_tokens, temperature=0.0, top_p=0.9
+                )
+                self.hedger.latency.observe(time.monotonic() - started)
+                return completion
+
+        started = time.monotonic()
+        try:
+            completion = await asyncio.wait_for(self.hedger.run(attempt), LLM_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, LLMTimeoutError):
+            self.breaker.record(False)
+            LLM_CALL_SECONDS.observe(time.monotonic() - started, call="complete", outcome="timeout")
+            raise
+        except LLMError:
+            self.breaker.record(False)
+            LLM_CALL_SECONDS.observe(time.monotonic() - started, call="complete", outcome="error")
+            raise
+        except BaseException:
+            self.breaker.abandon()
+            raise
+        self.breaker.record(True)
+        LLM_CALL_SECONDS.observe(time.monotonic() - started, call="complete", outcome="ok")
+        self._record_usage(completion.prompt_tokens, completion.completion_tokens)
+        return completion.text
+
+    def _record_usage(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        LLM_PROMPT_TOKENS.observe(prompt_tokens)
+        LLM_COMPLETION_TOKENS.observe(completion_tokens)
+
+    async def summarize(self, summary: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Fold `messages` into the running conversation `summary`. Returns None
+        if the summary could not be produced.
+        """
+        if not self.backend or not messages:
+            return None
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"New conversation turns:\n{transcript}\n\n"
+            "Update the summary to cover the new turns. Keep the reported symptoms, "
+            "error codes, checks already done, diagnoses given and open questions. "
+            "Plain text, at most 150 words."
+        )
+        try:
+            response = await self._complete(
+                [
+                    {"role": "system", "content": "You summarize automotive diagnostic conversations."},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=SUMMARY_MAX_TOKENS,
+            )
+            return re.sub(r'\*\*', '', response).strip() or None
+        except Exception as e:
+            logger.error(f"Error in summarize: {str(e)}")
+            return None
 
     def _check_zia_mention(self, user_message: str) -> bool:
         """
@@ -59,60 +214,117 @@ class DiagnoseLLM:
         message_lower = user_message.lower()
         return any(kw in message_lower for kw in ["zia", "zia ul din", "who", "who are you", "who built you", "who created you"])
 
+    def _creator_reply(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Fixed reply when the latest user message asks who built the assistant.
+        """
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+        if user_messages and self._check_zia_mention(user_messages[-1]["content"]):
+            return (
+                "I am AutoGenius, an expert automotive diagnostic assistant built by Zia Ul Din, a data analyst and AI developer currently pursuing a BS in Business Analytics at International Islamic University Islamabad. Zia specializes in data analytics, machine learning, NLP, and AI-driven solutions, with hands-on experience developing predictive models, interactive dashboards, and chatbots using Python, SQL, Power BI, Flask, Gradio, and LLMs. His notable projects include AI Auto Workshop (AI-powered vehicle diagnostics and repair cost estimation), geospatial market analysis, and AI voice chatbot applications. How can I help with your vehicle today?"
+            )
+        return None
+
+    def _latest_user_message(self, messages: List[Dict[str, str]]) -> str:
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+        return user_messages[-1]["content"] if user_messages else ""
+
+    def _known_issues_reply(self, messages: List[Dict[str, str]], session: ChatSession) -> Optional[str]:
+        """
+        Answer questions about the vehicle's common problems straight from
+        the known-issues index, without a completion.
+        """
+        if not self.known_issues.is_known_issue_question(self._latest_user_message(messages)):
+            return None
+        issues = self.known_issues.for_vehicle(session.manufacturer, session.model, session.year)
+        if not issues:
+            return None
+        self.local_answers += 1
+        return known_issues_reply(f"{session.year} {session.manufacturer} {session.model}", issues)
+
+    def _unavailable_reply(self, messages: List[Dict[str, str]], session: ChatSession) -> str:
+        """
+        Reply while the circuit is open, with any known issues matching the
+        user's description.
+        """
+        matches = self.known_issues.match(
+            session.manufacturer, session.model, session.year, self._latest_user_message(messages)
+        )
+        if not matches:
+            return UNAVAILABLE_REPLY
+        return (
+            f"{UNAVAILABLE_REPLY}\n\nMeanwhile, these known issues for the {session.year} "
+            f"{session.manufacturer} {session.model} match what you describe:\n"
+            + "\n".join(f"{n}. {describe(m.issue)}" for n, m in enumerate(matches, 1))
+        )
+
+    def _is_vehicle_query(self, messages: List[Dict[str, str]]) -> bool:
+        """
+        Whether the latest user message asks what vehicle is being discussed.
+        """
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+        user_query = user_messages[-1]["content"].lower() if user_messages else ""
+        return any(q in user_query for q in [
+            "what car", "which vehicle", "my car", "what vehicle",
+            "what am i driving", "what's my car"
+        ])
+
+    def _build_messages(self, messages: List[Dict[str, str]], session: ChatSession) -> List[Dict[str, str]]:
+        """
+        System prompt, vehicle context and conversation history for the LLM.
+        """
+        vehicle_info = f"{session.year} {session.manufacturer} {session.model}"
+        vehicle_context = (
+            f"Current Vehicle: {vehicle_info}\n"
+            f"All responses must be specific to this vehicle unless otherwise noted."
+        )
+        processed_messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "system", "content": vehicle_context}
+        ]
+
+        # Ground the answer in known issues matching the user's description
+        matches = self.known_issues.match(
+            session.manufacturer, session.model, session.year, self._latest_user_message(messages)
+        )
+        if matches:
+            self.grounded_prompts += 1
+            processed_messages.append({"role": "system", "content": grounding_prompt(matches)})
+
+        # Add conversation history (excluding previous system messages)
+        processed_messages.extend(
+            msg for msg in messages
+            if msg["role"] not in ["system", "assistant"] or "Current Vehicle:" not in msg["content"]
+        )
+        return processed_messages
+
     async def get_diagnosis(self, messages: List[Dict[str, str]], session: ChatSession) -> str:
         """
         Generate diagnosis with strict vehicle context.
         """
         try:
-            if not self.client:
+            if not self.backend:
                 return "I'm having technical difficulties. Please try again later."
 
             # Check for creator mention
-            user_messages = [msg for msg in messages if msg["role"] == "user"]
-            if user_messages and self._check_zia_mention(user_messages[-1]["content"]):
-                return (
-                    "I am AutoGenius, an expert automotive diagnostic assistant built by Zia Ul Din, a data analyst and AI developer currently pursuing a BS in Business Analytics at International Islamic University Islamabad. Zia specializes in data analytics, machine learning, NLP, and AI-driven solutions, with hands-on experience developing predictive models, interactive dashboards, and chatbots using Python, SQL, Power BI, Flask, Gradio, and LLMs. His notable projects include AI Auto Workshop (AI-powered vehicle diagnostics and repair cost estimation), geospatial market analysis, and AI voice chatbot applications. How can I help with your vehicle today?"
-                )
-
-            # Create vehicle context
-            vehicle_info = f"{session.year} {session.manufacturer} {session.model}"
-            vehicle_context = (
-                f"Current Vehicle: {vehicle_info}\n"
-                f"All responses must be specific to this vehicle unless otherwise noted."
-            )
+            creator_reply = self._creator_reply(messages)
+            if creator_reply:
+                return creator_reply
 
-            # Check if user is asking about their vehicle
-            user_query = user_messages[-1]["content"].lower() if user_messages else ""
-            is_vehicle_query = any(q in user_query for q in [
-                "what car", "which vehicle", "my car", "what vehicle", 
-                "what am i driving", "what's my car"
-            ])
-
-            # Prepare messages for LLM
-            processed_messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "system", "content": vehicle_context}
-            ]
-            
-            # Add conversation history (excluding previous system messages)
-            processed_messages.extend(
-                msg for msg in messages 
-                if msg["role"] not in ["system", "assistant"] or "Current Vehicle:" not in msg["content"]
-            )
+            # Known-issue questions are answered locally
+            local_reply = self._known_issues_reply(messages, session)
+            if local_reply:
+                return local_reply
 
-            # Generate response
-            chat_completion = self.client.chat.completions.create(
-                model="gemma-7b-it",
-                messages=processed_messages,
-                temperature=0.0,
-                max_tokens=1024,
-                top_p=0.9
-            )
-            
-            response = chat_completion.choices[0].message.content
+            vehicle_info = f"{session.year} {session.manufacturer} {session.model}"
+            is_vehicle_query = self._is_vehicle_query(messages)
 
-            # Remove any special formatting (like **)
-            response = re.sub(r'\*\*', '', response)
+            # Generate response, or reuse one for the same conversation
+            llm_messages = self._build_messages(messages, session)
+            cache_key = self._cache_key(llm_messages)
+            response = await self.cache.get(cache_key)
+            if response is None:
+                response = await self.flights.do(cache_key, lambda: self._generate(cache_key, llm_messages))
 
             # Force vehicle info for vehicle queries
             if is_vehicle_query:
@@ -123,7 +335,169 @@ class DiagnoseLLM:
                 )
             
             return response
-        
+
+        except CircuitOpenError:
+            return self._unavailable_reply(messages, session)
+
+        except (asyncio.TimeoutError, LLMTimeoutError):
+            logger.warning("Diagnosis timed out after %.1fs", LLM_TIMEOUT_SECONDS)
+            return TIMEOUT_REPLY
+
         except Exception as e:
             logger.error(f"Error in get_diagnosis: {str(e)}")
             return "I encountered a technical error. Please describe your vehicle issue."
+
+    async def stream_diagnosis(self, messages: List[Dict[str, str]], session: ChatSession) -> AsyncIterator[str]:
+        """
+        Generate the diagnosis as text chunks while the LLM produces them,
+        with `**` stripped as in get_diagnosis.
+        """
+        if not self.backend:
+            yield "I'm having technical difficulties. Please try again later."
+            return
+
+        creator_reply = self._creator_reply(messages)
+        if creator_reply:
+            yield creator_reply
+            return
+
+        # Known-issue questions are answered locally
+        local_reply = self._known_issues_reply(messages, session)
+        if local_reply:
+            yield local_reply
+            return
+
+        # Vehicle queries get a fixed answer, no completion needed
+        if self._is_vehicle_query(messages):
+            yield f"You have a {session.year} {session.manufacturer} {session.model}. How can I help with your vehicle today?"
+            return
+
+        llm_messages = self._build_messages(messages, session)
+        cache_key = self._cache_key(llm_messages)
+        cached = await self.cache.get(cache_key)
+        if cached is None:
+            # the same request is already being answered: wait for that reply
+            flight = self.flights.join(cache_key)
+            if flight is not None:
+                try:
+                    cached = await asyncio.shield(flight)
+                except FlightAbandoned:
+                    pass
+                except CircuitOpenError:
+                    yield self._unavailable_reply(messages, session)
+                    return
+                except (asyncio.TimeoutError, LLMTimeoutError):
+                    yield TIMEOUT_REPLY
+                    return
+                except Exception as e:
+                    logger.error(f"Error in stream_diagnosis: {str(e)}")
+                    yield "I encountered a technical error. Please describe your vehicle issue."
+                    return
+        if cached is not None:
+            yield cached
+            return
+
+        flight = self.flights.lead(cache_key)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + LLM_TIMEOUT_SECONDS
+        stripper = MarkdownStripper()
+        emitted = False
+        first_token = True
+        parts = []
+        stream = None
+        usage = StreamUsage()
+        # breaker outcome of this call: None while undecided
+        allowed, outcome, timed_out = False, None, False
+        try:
+            if not self.breaker.allow():
+                raise CircuitOpenError("circuit open")
+            allowed = True
+            await asyncio.wait_for(self.semaphore.acquire(), LLM_TIMEOUT_SECONDS)
+            try:
+                stream = self.backend.stream(
+                    llm_messages, max_tokens=1024, temperature=0.0, top_p=0.9, usage=usage,
+                )
+                while True:
+                    try:
+                        delta = await asyncio.wait_for(stream.__anext__(), deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    if first_token:
+                        first_token = False
+                        LLM_FIRST_TOKEN_SECONDS.observe(loop.time() - started)
+                    text = stripper.feed(delta)
+                    if text:
+                        emitted = True
+                        parts.append(text)
+                        yield text
+            finally:
+                self.semaphore.release()
+                if stream is not None:
+                    await stream.aclose()
+
+            outcome = True
+            if usage.prompt_tokens or usage.completion_tokens:
+                self._record_usage(usage.prompt_tokens, usage.completion_tokens)
+            tail = stripper.flush()
+            parts.append(tail)
+            response = "".join(parts)
+            await self.cache.put(cache_key, response)
+            flight.set_result(response)
+            if tail:
+                yield tail
+
+        except CircuitOpenError as e:
+            flight.set_exception(e)
+            yield self._unavailable_reply(messages, session)
+
+        except (asyncio.TimeoutError, LLMTimeoutError) as e:
+            outcome, timed_out = False, True
+            flight.set_exception(e)
+            logger.warning("Streamed diagnosis timed out after %.1fs", LLM_TIMEOUT_SECONDS)
+            yield ("\n\n" if emitted else "") + TIMEOUT_REPLY
+
+        except Exception as e:
+            if isinstance(e, LLMError):
+                outcome = False
+            flight.set_exception(e)
+            logger.error(f"Error in stream_diagnosis: {str(e)}")
+            if not emitted:
+                yield "I encountered a technical error. Please describe your vehicle issue."
+
+        finally:
+            if allowed:
+                if outcome is None:
+                    self.breaker.abandon()
+                else:
+                    self.breaker.record(outcome)
+                LLM_CALL_SECONDS.observe(
+                    loop.time() - started, call="stream",
+                    outcome="abandoned" if outcome is None else "ok" if outcome else "timeout" if timed_out else "error",
+                )
+            if not flight.done():
+                flight.set_exception(FlightAbandoned())
+
+
+class MarkdownStripper:
+    """
+    Removes `**` from text that arrives in pieces. A trailing odd `*` is held
+    back until the next piece shows whether it completes a `**`, so the output
+    matches stripping the whole text at once.
+    """
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        text = self._pending + chunk
+        stars = len(text) - len(text.rstrip("*"))
+        if stars % 2:
+            text, self._pending = text[:-1], "*"
+        else:
+            self._pending = ""
+        return re.sub(r'\*\*', '', text)
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return text
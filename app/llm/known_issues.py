@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import math
+import bisect
+import logging
+from datetime import datetime
+from typing import NamedTuple
+
+from app.recommend.keywords import get_matcher
+from app.recommend.vehicles import vehicle_key
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+KNOWN_ISSUES_PATH = os.getenv(
+    "KNOWN_ISSUES_PATH", os.path.join(ROOT_DIR, "data", "car_issues_db.json")
+)
+# Least symptom-match score (summed idf of shared terms) that counts as a match.
+KNOWN_ISSUES_MIN_SCORE = float(os.getenv("KNOWN_ISSUES_MIN_SCORE", "2.5"))
+# Least number of distinct shared terms; one rare word alone is no match.
+KNOWN_ISSUES_MIN_TERMS = int(os.getenv("KNOWN_ISSUES_MIN_TERMS", "2"))
+
+_WORD_RE = re.compile(r"[a-z][a-z0-9]+")
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "ion", "es", "ed", "ly", "s")
+_STOPWORDS = {
+    "the", "and", "for", "with", "from", "when", "while", "during", "after", "before", "into",
+    "my", "car", "vehicle", "its", "are", "was", "has", "have", "had", "been", "is",
+    "this", "that", "there", "what", "why", "how", "can", "could", "does", "doing", "feel",
+    "feels", "seems", "some", "very", "really", "also", "but", "not", "any", "all", "out",
+    "issue", "issues", "problem", "problems", "becomes", "become",
+    # repair-talk words that name no symptom or part
+    "check", "checks", "checked", "checking", "replace", "replaced", "replacing", "replacement",
+    "worn", "wear", "inspect", "inspected", "repair", "repaired", "fix", "fixed", "need", "needs",
+    "part", "parts", "new", "old", "sign", "signs", "possible", "may", "might",
+}
+
+# Questions asking for the known issues of the user's vehicle itself.
+_KNOWN_ISSUE_QUESTION_RE = re.compile(
+    r"\b(?:common|known|typical|frequent|usual)\s+(?:issues?|problems?|faults?|failures?)\b"
+    r"|\bwhat\s+(?:usually|commonly|often)\s+(?:goes\s+wrong|fails|breaks)\b"
+)
+
+# --- Helpers --------------------------------------------------------------
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            break
+    return word[:6]
+
+
+def symptom_terms(text: str) -> set[str]:
+    """
+    Match terms for free text: canonical lexicon terms (so "CEL" meets
+    "check engine light") plus lightly stemmed content words.
+    """
+    lowered = text.lower()
+    terms = set(get_matcher().extract(lowered))
+    terms.update(_stem(w) for w in _WORD_RE.findall(lowered) if w not in _STOPWORDS)
+    return terms
+
+
+def _parse_range(spec: str) -> tuple[int, int]:
+    """
+    "2015-2020" -> (2015, 2020); "8+" -> (8, large); "2019" -> (2019, 2019).
+    """
+    spec = spec.strip()
+    if spec.endswith("+"):
+        return int(spec[:-1]), 10 ** 6
+    first, _, last = spec.partition("-")
+    return int(first), int(last or first)
+
+
+class KnownIssue(NamedTuple):
+    issue: str
+    symptoms: str
+    parts_to_check: tuple
+    severity: str
+    # "model" for the vehicle's own record, "age" for issues of its age band
+    source: str
+
+
+class IssueMatch(NamedTuple):
+    issue: KnownIssue
+    score: float
+
+# --- Interval Lookup ------------------------------------------------------
+
+class _Intervals:
+    """
+    Closed integer ranges with payloads, queried by point. Ranges are sorted
+    by start; `max_end` (running maximum of the ends) bounds how far back
+    a stabbing query has to look.
+    """
+
+    def __init__(self, ranges: list[tuple[int, int, list]]):
+        ranges = sorted(ranges, key=lambda r: (r[0], r[1]))
+        self.starts = [r[0] for r in ranges]
+        self.ends = [r[1] for r in ranges]
+        self.payloads = [r[2] for r in ranges]
+        self.max_end = []
+        for end in self.ends:
+            self.max_end.append(max(end, self.max_end[-1]) if self.max_end else end)
+
+    def stab(self, point: int) -> list:
+        found = []
+        i = bisect.bisect_right(self.starts, point) - 1
+        while i >= 0 and self.max_end[i] >= point:
+            if self.ends[i] >= point:
+                found.extend(self.payloads[i])
+            i -= 1
+        return found
+
+# --- Index ----------------------------------------------------------------
+
+class KnownIssuesIndex:
+    """
+    In-memory index over data/car_issues_db.json: known issues per vehicle
+    by model-year range, issues by vehicle age, and a term index over each
+    issue's name, symptoms and parts for matching a user's description.
+    """
+
+    def __init__(self, data: dict):
+        self._models: dict[str, _Intervals] = {}
+        issues: list[KnownIssue] = []
+
+        def add(raw: list, source: str) -> list[KnownIssue]:
+            added = []
+            for item in raw:
+                issue = KnownIssue(
+                    item["issue"], item.get("symptoms", ""),
+                    tuple(item.get("parts_to_check", [])), item.get("severity", ""), source,
+                )
+                issues.append(issue)
+                added.append(issue)
+            return added
+
+        for make, models in data.get("common_issues", {}).items():
+            for model, ranges in models.items():
+                self._models[vehicle_key(make, model)] = _Intervals(
+                    [(*_parse_range(spec), add(raw, "model")) for spec, raw in ranges.items()]
+                )
+        self._ages = _Intervals(
+            [(*_parse_range(spec), add(raw, "age")) for spec, raw in data.get("age_based_issues", {}).items()]
+        )
+
+        self._terms: dict[KnownIssue, set[str]] = {
+            issue: symptom_terms(" ".join([issue.issue, issue.symptoms, *issue.parts_to_check]))
+            for issue in issues
+        }
+        df: dict[str, int] = {}
+        for terms in self._terms.values():
+            for term in terms:
+                df[term] = df.get(term, 0) + 1
+        n = max(len(self._terms), 1)
+        self._idf = {term: math.log(1 + n / count) for term, count in df.items()}
+
+    @classmethod
+    def load(cls, path: str = KNOWN_ISSUES_PATH) -> "KnownIssuesIndex":
+        with open(path, encoding="utf-8") as f:
+            index = cls(json.load(f))
+        logger.info("Indexed %d known issues for %d models from %s", len(index._terms), len(index._models), path)
+        return index
+
+    @classmethod
+    def empty(cls) -> "KnownIssuesIndex":
+        return cls({})
+
+    def for_vehicle(self, manufacturer: str, model: str, year: int) -> list[KnownIssue]:
+        """
+        Issues on record for the model in `year`, then those common at the
+        vehicle's age.
+        """
+        found = []
+        intervals = self._models.get(vehicle_key(manufacturer, model))
+        if intervals is not None:
+            found.extend(intervals.stab(year))
+        age = max(datetime.now().year - year, 0)
+        found.extend(self._ages.stab(age))
+        return found
+
+    def match(self, manufacturer: str, model: str, year: int, text: str,
+              limit: int = 3, min_score: float = KNOWN_ISSUES_MIN_SCORE) -> list[IssueMatch]:
+        """
+        The vehicle's known issues whose description overlaps `text`, best
+        first; model-specific issues win ties over age-based ones.
+        """
+        query = symptom_terms(text)
+        if not query:
+            return []
+        matches = []
+        for issue in self.for_vehicle(manufacturer, model, year):
+            shared = self._terms[issue] & query
+            if len(shared) < KNOWN_ISSUES_MIN_TERMS:
+                continue
+            score = sum(self._idf[t] for t in shared)
+            if score >= min_score:
+                matches.append(IssueMatch(issue, score))
+        matches.sort(key=lambda m: (-m.score, m.issue.source != "model"))
+        return matches[:limit]
+
+    def is_known_issue_question(self, text: str) -> bool:
+        """
+        True for a request for the vehicle's common problems that describes
+        no symptom of its own; a message naming an automotive term, an OBD
+        code or a word of the issue descriptions needs a diagnosis instead.
+        """
+        lowered = text.lower()
+        if not _KNOWN_ISSUE_QUESTION_RE.search(lowered):
+            return False
+        if get_matcher().extract(lowered):
+            return False
+        rest = _KNOWN_ISSUE_QUESTION_RE.sub(" ", lowered)
+        return not (symptom_terms(rest) & self._idf.keys())
+
+# --- Formatting -----------------------------------------------------------
+
+def describe(issue: KnownIssue) -> str:
+    parts = ", ".join(issue.parts_to_check)
+    return f"{issue.issue} ({issue.severity} severity). Symptoms: {issue.symptoms}. Parts to check: {parts}."
+
+
+def grounding_prompt(matches: list[IssueMatch]) -> str:
+    """
+    System message with the known issues matching the user's description.
+    """
+    lines = "\n".join(f"- {describe(m.issue)}" for m in matches)
+    return (
+        "Known issues on record for this vehicle that match the user's description. "
+        "Use them to ground the diagnosis where they fit:\n" + lines
+    )
+
+
+def known_issues_reply(vehicle_info: str, issues: list[KnownIssue]) -> str:
+    """
+    A plain-text answer listing the vehicle's known issues.
+    """
+    model_issues = [i for i in issues if i.source == "model"]
+    age_issues = [i for i in issues if i.source == "age"]
+    sections = []
+    if model_issues:
+        sections.append(
+            f"Known issues for the {vehicle_info}:\n"
+            + "\n".join(f"{n}. {describe(i)}" for n, i in enumerate(model_issues, 1))
+        )
+    if age_issues:
+        sections.append(
+            "Common issues for vehicles of this age:\n"
+            + "\n".join(f"{n}. {describe(i)}" for n, i in enumerate(age_issues, 1))
+        )
+    sections.append("Tell me what symptoms you are noticing and I can help narrow it down.")
+    return "\n\n".join(sections)
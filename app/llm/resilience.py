@@ -0,0 +1,222 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from app.llm.backends import LLMError
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# Hedging: when a completion has not returned after the recent p95 latency
+# (never sooner than the minimum), send a second identical request and take
+# whichever finishes first. At most LLM_HEDGE_BUDGET of calls are hedged.
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250"))
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+# Samples needed before the latency quantile is trusted.
+LLM_HEDGE_MIN_SAMPLES = 20
+
+# Circuit breaker: open when at least LLM_BREAKER_ERROR_RATE of the calls in
+# the last LLM_BREAKER_WINDOW_SECONDS failed (given LLM_BREAKER_MIN_CALLS
+# calls), stay open LLM_BREAKER_OPEN_SECONDS, then let one probe through.
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "30"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "15"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(LLMError):
+    """
+    The circuit breaker is open; the call was not attempted.
+    """
+
+# --- Latency Tracking -----------------------------------------------------
+
+class LatencyTracker:
+    """
+    Recent call latencies, for quantile estimates.
+    """
+
+    def __init__(self, size: int = 500):
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+# --- Circuit Breaker ------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the provider's recent error rate is high.
+
+    Closed: calls pass and their outcomes are counted over a sliding window.
+    Open: calls are refused until the cool-down ends. Half-open: a single
+    probe call passes; its success closes the circuit, its failure reopens it.
+    """
+
+    def __init__(self, error_rate: float = LLM_BREAKER_ERROR_RATE,
+                 min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 window_seconds: float = LLM_BREAKER_WINDOW_SECONDS,
+                 open_seconds: float = LLM_BREAKER_OPEN_SECONDS):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead now.
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probing = False
+            logger.info("LLM circuit half-open, probing")
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+        return True
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if success:
+                self.state = CLOSED
+                self._outcomes.clear()
+                logger.info("LLM circuit closed")
+            else:
+                self._open(now)
+            return
+
+        self._outcomes.append((now, success))
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+        if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if failures / len(self._outcomes) >= self.error_rate:
+                self._open(now)
+
+    def abandon(self):
+        """
+        An allowed call ended without an outcome (e.g. it was cancelled).
+        """
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.times_opened += 1
+        logger.warning("LLM circuit opened for %gs after repeated failures", self.open_seconds)
+
+    def stats(self) -> dict:
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_in_seconds": (
+                round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+                if self.state == OPEN else 0.0
+            ),
+        }
+
+# --- Hedging --------------------------------------------------------------
+
+class Hedger:
+    """
+    Runs a call and, if it is slower than the recent p95, a backup copy of
+    it; returns the first success and cancels the other. Callers feed
+    `latency` with the provider time of each call.
+    """
+
+    def __init__(self, enabled: bool = LLM_HEDGE, quantile: float = LLM_HEDGE_QUANTILE,
+                 min_delay_ms: float = LLM_HEDGE_MIN_DELAY_MS, budget: float = LLM_HEDGE_BUDGET):
+        self.enabled = enabled
+        self.quantile = quantile
+        self.min_delay = min_delay_ms / 1000
+        self.budget = budget
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> Optional[float]:
+        """
+        Seconds to wait before hedging, or None to not hedge this call.
+        """
+        if not self.enabled or len(self.latency) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        if self.hedged >= self.budget * self.calls:
+            return None
+        return max(self.min_delay, self.latency.quantile(self.quantile))
+
+    async def run(self, call: Callable[[], Awaitable]):
+        self.calls += 1
+        delay = self.delay()
+        if delay is None:
+            return await call()
+
+        primary = asyncio.ensure_future(call())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(call()))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        p = self.latency.quantile(self.quantile)
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            f"p{int(self.quantile * 100)}_ms": round(p * 1000, 1) if p is not None else None,
+        }
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+
+class FlightAbandoned(Exception):
+    """
+    The leading call stopped without a result (e.g. its client went away);
+    waiters should make the call themselves.
+    """
+
+# --- Single Flight --------------------------------------------------------
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    call, later callers wait for and share its result (or exception) instead
+    of starting their own. Keys are forgotten once the call finishes, so this
+    only dedupes requests that overlap in time.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, asyncio.Future] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        """
+        Return the result of `fn()`, shared with concurrent callers of `key`.
+        The call runs as its own task, so one caller going away does not
+        cancel it for the others.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight)
+            except FlightAbandoned:
+                pass
+
+        task = asyncio.ensure_future(fn())
+        self._register(key, task)
+        return await asyncio.shield(task)
+
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """
+        The in-flight call for `key`, if any, counted as coalesced.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        return flight
+
+    def lead(self, key: str) -> asyncio.Future:
+        """
+        Register the caller as the one making the call for `key`. It must
+        resolve the returned future, or fail it with FlightAbandoned.
+        """
+        flight = asyncio.get_running_loop().create_future()
+        self._register(key, flight)
+        return flight
+
+    def _register(self, key: str, flight: asyncio.Future):
+        self.upstream_calls += 1
+        self._flights[key] = flight
+        flight.add_done_callback(lambda f: self._finish(key, f))
+
+    def _finish(self, key: str, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # mark the outcome retrieved; the callers that care have seen it
+        if not flight.cancelled():
+            flight.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,290 @@
+import os
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# Add a Server-Timing header with the stage timings to every response.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+POOL_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+# --- Metrics --------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), fn: Optional[Callable] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # read at scrape time instead of recorded: returns a number, or a
+        # dict of label-value tuples to numbers
+        self.fn = fn
+        self._values: dict[tuple, float] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _current(self) -> dict[tuple, float]:
+        if self.fn is None:
+            return self._values
+        value = self.fn()
+        return value if isinstance(value, dict) else {(): value}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            values = self._current()
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {e}")
+            return lines
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Process-wide metrics, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = (), fn: Optional[Callable] = None) -> Counter:
+        return self._register(Counter(name, help, labelnames, fn))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = (), fn: Optional[Callable] = None) -> Gauge:
+        return self._register(Gauge(name, help, labelnames, fn))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to handle a request, streamed body included",
+    ("method", "handler", "status"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "app_stage_duration_seconds", "Time spent in each stage of a request",
+    ("handler", "stage"),
+)
+
+# --- Request Timing -------------------------------------------------------
+
+class RequestTimings:
+    """
+    Stage timings of the request being handled.
+    """
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.spans: list[tuple[str, float]] = []
+
+    @property
+    def handler(self) -> str:
+        # the route template, once routing has matched one
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def header(self, total: float) -> str:
+        totals: dict[str, float] = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+        entries.append(f"app;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a stage of the current request: recorded in the stage histogram and
+    the response's Server-Timing header. Tasks started by the request inherit
+    it; outside a request the handler label is "background".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings = _timings.get()
+        STAGE_SECONDS.observe(elapsed, handler=timings.handler if timings else "background", stage=stage)
+        if timings is not None:
+            timings.spans.append((stage, elapsed))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. The Server-Timing header is
+    written with the response headers, so it lists the stages finished by
+    then; a streamed body's later stages only reach the histograms.
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope)
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    header = timings.header(time.perf_counter() - started)
+                    message = {**message, "headers": [
+                        *message.get("headers", []), (b"server-timing", header.encode("latin-1")),
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _timings.reset(token)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"], handler=timings.handler, status=str(status),
+            )
+
+# --- Database Pool --------------------------------------------------------
+
+def instrument_pool(engine):
+    """
+    Export the connection pool of an async engine: connections in use at
+    each checkout as a histogram, pool size / in use / overflow gauges, and
+    for a MeasuredQueuePool the time checkouts take and their timeouts.
+    """
+    from sqlalchemy import event
+
+    pool = engine.sync_engine.pool
+    in_use = REGISTRY.histogram(
+        "db_pool_checked_out_at_checkout", "Connections in use when one is checked out",
+        buckets=POOL_BUCKETS,
+    )
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        if hasattr(pool, "checkedout"):
+            in_use.observe(pool.checkedout())
+
+    def gauge(method: str):
+        return lambda: getattr(pool, method)() if hasattr(pool, method) else 0
+
+    REGISTRY.gauge("db_pool_size", "Connections the pool keeps open", fn=gauge("size"))
+    REGISTRY.gauge("db_pool_checked_out", "Connections currently in use", fn=gauge("checkedout"))
+    # QueuePool counts overflow up from -size
+    overflow = gauge("overflow")
+    REGISTRY.gauge("db_pool_overflow", "Connections open beyond the pool size", fn=lambda: max(overflow(), 0))
+
+    opened = REGISTRY.counter("db_pool_connections_opened_total", "Database connections opened")
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_conn, record):
+        opened.inc()
+
+    if hasattr(pool, "observers"):
+        checkout = REGISTRY.histogram(
+            "db_pool_checkout_seconds", "Time to get a connection from the pool, waiting or connecting",
+            buckets=LATENCY_BUCKETS,
+        )
+        pool.observers.append(checkout.observe)
+        REGISTRY.counter("db_pool_checkout_timeouts_total", "Checkouts that timed out waiting for a connection",
+                         fn=lambda: engine.sync_engine.pool.timeouts)
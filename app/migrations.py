@@ -0,0 +1,98 @@
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select, text, update
+
+from app.database import Base, add_missing_columns
+from app.history_purge import PURGE_OWNER_PREFIX
+from app.models import ChatSession, Message
+from app.session_stats import backfill_session_stats
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# Postgres advisory lock held while migrating, so concurrently starting
+# workers apply each migration once.
+MIGRATION_LOCK_KEY = 72_410_022
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# --- Migrations -----------------------------------------------------------
+
+def _create_index(table, name: str):
+    """
+    Create one of the indexes declared on a model. New databases get it from
+    create_all; on a large Postgres table, build it beforehand with
+    CREATE INDEX CONCURRENTLY and this step finds it in place.
+    """
+    index = next(i for i in table.__table__.indexes if i.name == name)
+
+    def apply(sync_conn):
+        index.create(sync_conn, checkfirst=True)
+    return apply
+
+
+def _flag_pending_purges(sync_conn):
+    """
+    Index the sessions waiting for the history purge, and flag those handed
+    over before the purge looked for them by purge_pending.
+    """
+    _create_index(ChatSession, "ix_chat_sessions_purge_pending")(sync_conn)
+    sync_conn.execute(
+        update(ChatSession)
+        .where(ChatSession.user_id.startswith(PURGE_OWNER_PREFIX, autoescape=True))
+        .values(purge_pending=True)
+    )
+
+
+# (version, name, apply(sync_conn)), applied in order and never edited once
+# released; append new ones at the end. The indexes come before the
+# backfill, which reads messages by session.
+MIGRATIONS = [
+    (1, "index messages by session and time",
+     _create_index(Message, "ix_messages_session_id_timestamp")),
+    (2, "index chat sessions by user and creation time",
+     _create_index(ChatSession, "ix_chat_sessions_user_id_created_at")),
+    (3, "backfill session message stats", backfill_session_stats),
+    (4, "index chat sessions waiting for the history purge", _flag_pending_purges),
+]
+
+# --- Runner ---------------------------------------------------------------
+
+def applied_versions(sync_conn) -> set[int]:
+    schema_migrations.create(sync_conn, checkfirst=True)
+    return set(sync_conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def migrate(sync_conn) -> list[int]:
+    """
+    Bring the schema up to date: create missing tables and nullable
+    columns, then apply pending migrations in order, each recorded in
+    schema_migrations. Run with `conn.run_sync(migrate)` inside
+    `engine.begin()`; returns the versions applied.
+    """
+    if sync_conn.dialect.name == "postgresql":
+        sync_conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+    Base.metadata.create_all(sync_conn)
+    add_missing_columns(sync_conn)
+
+    done = applied_versions(sync_conn)
+    applied = []
+    for version, name, apply in MIGRATIONS:
+        if version in done:
+            continue
+        logger.info("Applying migration %d: %s", version, name)
+        apply(sync_conn)
+        sync_conn.execute(insert(schema_migrations).values(
+            version=version, name=name,
+            applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+        ))
+        applied.append(version)
+    return applied
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Text, Boolean, DateTime, ForeignKey, Index, true
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -24,9 +24,34 @@ class ChatSession(Base):
     year = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     text_size = Column(String, default="xxlarge")
+    # rolling summary of the conversation up to and including message summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+    # kept up to date as messages are written (app/session_stats.py), so
+    # history listings need no per-session message queries
+    message_count = Column(Integer, nullable=True, default=0)
+    last_message_preview = Column(Text, nullable=True)
+    last_activity_at = Column(DateTime, nullable=True)
+    # set on sessions cleared by their user and waiting for the background
+    # purge (app/history_purge.py); NULL otherwise
+    purge_pending = Column(Boolean, nullable=True)
     
-    # Relationship to Message
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan", order_by="Message.timestamp")
+    # Relationship to Message; the database cascades deletes to messages, so
+    # the ORM does not load them to delete them
+    messages = relationship(
+        "Message", back_populates="session", cascade="all, delete-orphan",
+        passive_deletes=True, order_by="Message.timestamp",
+    )
+
+    # a user's sessions, newest first (history listing, keyset pages)
+    __table_args__ = (
+        Index("ix_chat_sessions_user_id_created_at", "user_id", "created_at", "id"),
+        # only the few sessions waiting for the purge
+        Index(
+            "ix_chat_sessions_purge_pending", "id",
+            postgresql_where=purge_pending.is_(true()), sqlite_where=purge_pending.is_(true()),
+        ),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -40,4 +65,9 @@ class Message(Base):
     products = Column(Text, nullable=True)  # JSON string of product recommendations
     
     # Relationship to ChatSession
-    session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    session = relationship("ChatSession", back_populates="messages")
+
+    # a session's messages in order (chat context, transcript pages, cascades)
+    __table_args__ = (
+        Index("ix_messages_session_id_timestamp", "session_id", "timestamp", "id"),
+    )
\ No newline at end of file
@@ -0,0 +1,59 @@
+import os
+import json
+import base64
+import binascii
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+# --- Configuration --------------------------------------------------------
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+# --- Cursors --------------------------------------------------------------
+
+def encode_cursor(at: datetime, row_id) -> str:
+    """
+    Opaque cursor for the position of a row in (timestamp, id) order.
+    """
+    raw = json.dumps([at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, id_type: type = None) -> tuple[datetime, object]:
+    """
+    Inverse of encode_cursor. With `id_type`, the id must be of that type
+    (int ids of messages, str ids of sessions), so a crafted cursor fails
+    here rather than in the database.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        at, row_id = json.loads(raw)
+        if id_type is not None and type(row_id) is not id_type:
+            raise TypeError(f"cursor id is not {id_type.__name__}")
+        return datetime.fromisoformat(at), row_id
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def before(at_column, id_column, cursor: str):
+    """
+    Filter for rows strictly older than `cursor` in (at, id) order: the
+    keyset condition, spelled out so every backend can use the index.
+    """
+    at, row_id = decode_cursor(cursor, id_column.type.python_type)
+    return or_(at_column < at, and_(at_column == at, id_column < row_id))
+
+
+def page(rows: list, limit: int, cursor_of) -> tuple[list, str | None]:
+    """
+    Split `limit + 1` newest-first rows into the page and the cursor of the
+    next (older) page, None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, cursor_of(rows[-1])
@@ -0,0 +1,262 @@
+"""
+Offline build and memory-mapped loading of the product recommendation index.
+
+Build once (e.g. after a new PakWheels scrape):
+
+    python -m app.recommend.index_artifact --csv data/pakwheels_products.csv
+
+Workers then memory-map the latest build at startup instead of refitting the
+TF-IDF vectorizer inside the first chat request. The posting arrays and the
+product columns are opened read-only with `mmap_mode="r"`, so every worker
+process on a host shares the same page-cache pages.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.recommend.store import ProductStore
+from app.recommend.vehicles import Fitment
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_PATH = os.path.join(BASE_DIR, "data", "pakwheels_products.csv")
+INDEX_DIR = os.getenv("RECOMMEND_INDEX_DIR", os.path.join(BASE_DIR, "data", "recommend_index"))
+
+# Bump whenever the on-disk layout changes; older builds are then ignored.
+ARTIFACT_FORMAT_VERSION = 3
+
+# Name of the pointer file holding the build id of the active artifact.
+CURRENT_POINTER = "CURRENT"
+
+VECTORIZER_PARAMS = {
+    "min_df": 1,
+    "max_df": 0.95,
+    "stop_words": "english",
+    "ngram_range": (1, 3),
+    "max_features": 10000,
+    "analyzer": "word",
+}
+
+# --- Preparation ----------------------------------------------------------
+
+def make_vectorizer(**overrides) -> TfidfVectorizer:
+    """
+    Return a TfidfVectorizer configured the way the product index expects.
+    """
+    return TfidfVectorizer(**{**VECTORIZER_PARAMS, **overrides})
+
+
+def load_products_frame(csv_path: str = CSV_PATH) -> pd.DataFrame:
+    """
+    Load the products CSV, clean the text and price columns and add the
+    `combined_text` column used for TF-IDF. The raw title and details are
+    kept in `fitment_text`, since cleaning strips the dashes of year ranges.
+    """
+    df = pd.read_csv(csv_path)
+
+    df["fitment_text"] = ""
+    for col in ("title", "details"):
+        if col in df.columns:
+            df["fitment_text"] += df[col].fillna("").astype(str) + " "
+
+    # Expecting columns: id, title, details, manufacturer, price, url
+    # Clean text columns
+    for col in ("title", "details", "manufacturer"):
+        if col in df.columns:
+            df[col] = (
+                df[col]
+                .fillna("")
+                .astype(str)
+                .str.replace(r"[^\w\s]", "", regex=True)
+            )
+        else:
+            df[col] = ""
+
+    # Convert price column if present
+    if "price" in df.columns:
+        df["price"] = (
+            df["price"]
+            .astype(str)
+            .str.replace(r"[^\d\.]", "", regex=True)
+            .replace("", "0")
+            .astype(float)
+        )
+    else:
+        df["price"] = 0.0
+
+    # Combine all text for TF-IDF
+    df["combined_text"] = (
+        df["title"] + " " + df["details"] + " " + df["manufacturer"]
+    ).str.lower()
+
+    return df
+
+
+def source_signature(csv_path: str) -> dict:
+    """
+    Describe the source CSV so a build can be matched to the data it came from.
+    """
+    st = os.stat(csv_path)
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {
+        "path": os.path.abspath(csv_path),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "sha256": digest.hexdigest(),
+    }
+
+# --- Build ----------------------------------------------------------------
+
+def to_term_matrix(mat) -> csr_matrix:
+    """
+    Convert a products x terms TF-IDF matrix into the terms x products CSR
+    layout used for scoring. Each row is then the posting list of one term,
+    so `query @ term_matrix` only touches products sharing a query term.
+    """
+    term_mat = csr_matrix(mat.T)
+    term_mat.sort_indices()
+    return term_mat
+
+
+def build_artifact(csv_path: str = CSV_PATH, index_dir: str = INDEX_DIR) -> str:
+    """
+    Fit the vectorizer on `csv_path` and write a new versioned artifact under
+    `index_dir`. The `CURRENT` pointer is switched only after every file has
+    been written, so a reader never opens a partial build.
+
+    Returns the path of the new build directory.
+    """
+    started = time.perf_counter()
+    logger.info("Building recommendation index artifact from %s", csv_path)
+
+    df = load_products_frame(csv_path)
+    vect = make_vectorizer()
+    mat = vect.fit_transform(df["combined_text"])
+    term_mat = to_term_matrix(mat)
+
+    build_id = f"v{ARTIFACT_FORMAT_VERSION}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_dir = os.path.join(index_dir, f".{build_id}.tmp")
+    out_dir = os.path.join(index_dir, build_id)
+    os.makedirs(tmp_dir)
+
+    try:
+        vocabulary = {term: int(idx) for term, idx in vect.vocabulary_.items()}
+        with open(os.path.join(tmp_dir, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f, ensure_ascii=False)
+        np.save(os.path.join(tmp_dir, "idf.npy"), vect.idf_)
+        np.save(os.path.join(tmp_dir, "postings_data.npy"), term_mat.data)
+        np.save(os.path.join(tmp_dir, "postings_indices.npy"), term_mat.indices)
+        np.save(os.path.join(tmp_dir, "postings_indptr.npy"), term_mat.indptr)
+        ProductStore.from_frame(df).save(os.path.join(tmp_dir, "products"))
+        Fitment.build(df["fitment_text"]).save(os.path.join(tmp_dir, "fitment"))
+
+        manifest = {
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "build_id": build_id,
+            "created_at": time.time(),
+            "build_seconds": round(time.perf_counter() - started, 3),
+            "n_products": int(mat.shape[0]),
+            "n_features": int(mat.shape[1]),
+            "nnz": int(mat.nnz),
+            "vectorizer": {k: list(v) if isinstance(v, tuple) else v for k, v in VECTORIZER_PARAMS.items()},
+            "source": source_signature(csv_path),
+        }
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        os.replace(tmp_dir, out_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    pointer_tmp = os.path.join(index_dir, f".{CURRENT_POINTER}.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(build_id)
+    os.replace(pointer_tmp, os.path.join(index_dir, CURRENT_POINTER))
+
+    logger.info(
+        "Wrote artifact %s: %d products, %d features in %.2fs",
+        build_id, mat.shape[0], mat.shape[1], time.perf_counter() - started,
+    )
+    return out_dir
+
+# --- Load -----------------------------------------------------------------
+
+def current_build_dir(index_dir: str = INDEX_DIR):
+    """
+    Return the directory of the active build, or None if nothing is built.
+    """
+    pointer = os.path.join(index_dir, CURRENT_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        build_id = f.read().strip()
+    path = os.path.join(index_dir, build_id)
+    return path if os.path.isdir(path) else None
+
+
+def load_artifact(build_dir: str) -> dict:
+    """
+    Memory-map a build produced by `build_artifact`.
+
+    Returns a dict with `store`, `fitment`, `vectorizer`, `term_matrix` and
+    `manifest`. Raises
+    ValueError if the build was written with a different format version.
+    """
+    with open(os.path.join(build_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"Artifact {build_dir} has format {manifest.get('format_version')}, "
+            f"expected {ARTIFACT_FORMAT_VERSION}"
+        )
+
+    with open(os.path.join(build_dir, "vocabulary.json"), encoding="utf-8") as f:
+        vocabulary = json.load(f)
+    vect = make_vectorizer(vocabulary=vocabulary)
+    vect.idf_ = np.load(os.path.join(build_dir, "idf.npy"))
+
+    data = np.load(os.path.join(build_dir, "postings_data.npy"), mmap_mode="r")
+    indices = np.load(os.path.join(build_dir, "postings_indices.npy"), mmap_mode="r")
+    indptr = np.load(os.path.join(build_dir, "postings_indptr.npy"), mmap_mode="r")
+    term_mat = csr_matrix(
+        (data, indices, indptr),
+        shape=(manifest["n_features"], manifest["n_products"]),
+        copy=False,
+    )
+    store = ProductStore.load(os.path.join(build_dir, "products"), mmap_mode="r")
+    fitment = Fitment.load(os.path.join(build_dir, "fitment"), mmap_mode="r")
+
+    return {
+        "store": store,
+        "fitment": fitment,
+        "vectorizer": vect,
+        "term_matrix": term_mat,
+        "manifest": manifest,
+    }
+
+# --- CLI ------------------------------------------------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Build the product recommendation index artifact.")
+    parser.add_argument("--csv", default=CSV_PATH, help="products CSV to index")
+    parser.add_argument("--out", default=INDEX_DIR, help="directory holding versioned builds")
+    args = parser.parse_args()
+    print(build_artifact(args.csv, args.out))
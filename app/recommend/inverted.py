@@ -0,0 +1,88 @@
+import numpy as np
+
+from app.recommend.store import top_k as top_k_positions
+
+# --- Inverted Index -------------------------------------------------------
+
+class InvertedIndex:
+    """
+    Top-k retrieval over per-term posting lists with MaxScore-style early
+    termination.
+
+    Wraps a terms x products CSR matrix (each row one term's posting list,
+    sorted by product). Terms are visited in decreasing order of their best
+    possible contribution. Once the k-th best score collected so far beats
+    everything the unvisited terms could still add, no new product can enter
+    the top k: later terms only update the surviving candidates, looked up by
+    binary search instead of scanning the whole posting list.
+
+    Returns exactly the products and scores of the exhaustive dot product.
+    """
+
+    def __init__(self, term_matrix):
+        self.term_matrix = term_matrix
+        self.indptr = np.asarray(term_matrix.indptr)
+        self.indices = np.asarray(term_matrix.indices)
+        self.data = np.asarray(term_matrix.data)
+
+        # Largest weight in each posting list (0 for empty lists).
+        lengths = np.diff(self.indptr)
+        self.max_weights = np.zeros(len(lengths), dtype=self.data.dtype)
+        nonempty = lengths > 0
+        if nonempty.any():
+            self.max_weights[nonempty] = np.maximum.reduceat(self.data, self.indptr[:-1][nonempty])
+
+    def search(self, q_terms: np.ndarray, q_weights: np.ndarray, k: int, accept=None):
+        """
+        Return (products, scores) of the `k` best matches, best first.
+
+        `q_terms`/`q_weights` are the query's nonzero term ids and weights.
+        `accept`, if given, maps an array of products to a boolean mask of
+        those allowed in the result.
+        """
+        empty = (np.empty(0, dtype=self.indices.dtype), np.empty(0, dtype=self.data.dtype))
+        if k <= 0 or len(q_terms) == 0:
+            return empty
+
+        bounds = q_weights * self.max_weights[q_terms]
+        order = np.argsort(-bounds, kind="stable")
+        q_terms, q_weights, bounds = q_terms[order], q_weights[order], bounds[order]
+        # remaining[j]: most the terms after j could still add to any product
+        remaining = np.append(np.cumsum(bounds[::-1])[::-1][1:], 0.0)
+
+        cand = empty[0]
+        scores = empty[1]
+        admitting = True
+        for j, term in enumerate(q_terms):
+            start, end = self.indptr[term], self.indptr[term + 1]
+            if start == end:
+                continue
+            docs = self.indices[start:end]
+            weights = self.data[start:end]
+
+            if admitting:
+                contrib = q_weights[j] * weights
+                if accept is not None:
+                    mask = accept(docs)
+                    docs, contrib = docs[mask], contrib[mask]
+                merged = np.concatenate((cand, docs))
+                cand, inverse = np.unique(merged, return_inverse=True)
+                scores = np.bincount(
+                    inverse, weights=np.concatenate((scores, contrib)), minlength=len(cand)
+                )
+            elif len(cand):
+                pos = np.searchsorted(docs, cand)
+                pos[pos == len(docs)] = 0
+                hit = docs[pos] == cand
+                scores[hit] += q_weights[j] * weights[pos[hit]]
+
+            if len(scores) >= k:
+                threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+                if admitting and threshold > remaining[j]:
+                    admitting = False
+                if not admitting:
+                    keep = scores + remaining[j] >= threshold
+                    cand, scores = cand[keep], scores[keep]
+
+        best = top_k_positions(scores, k)
+        return cand[best], scores[best]
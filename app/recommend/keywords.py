@@ -0,0 +1,116 @@
+import os
+import re
+import json
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LEXICON_PATH = os.getenv(
+    "AUTOMOTIVE_LEXICON_PATH", os.path.join(ROOT_DIR, "data", "automotive_lexicon.json")
+)
+
+# OBD-II trouble codes of every family: P (powertrain), B (body), C (chassis)
+# and U (network), generic or manufacturer-specific, e.g. P0420, U0100, P0A80.
+OBD_CODE_PATTERN = r"[pbcu][0-3][0-9a-f]{3}"
+
+_SEPARATORS_RE = re.compile(r"[\s\-_]+")
+
+# --- Helpers --------------------------------------------------------------
+
+def _normalize(text: str) -> str:
+    return _SEPARATORS_RE.sub(" ", text.lower()).strip()
+
+
+def _trie_pattern(words) -> str:
+    """
+    Compile words into a regex shaped like a trie: shared prefixes are
+    written once, so matching at a position branches on the next character
+    instead of trying every word. Longer words win over their prefixes.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+# --- Matcher --------------------------------------------------------------
+
+class KeywordMatcher:
+    """
+    Multi-pattern matcher for automotive terms and OBD-II codes.
+
+    All surface forms (part names, symptoms, synonyms, qualified parts) are
+    compiled once into a single trie-shaped regex alongside the OBD code
+    pattern, so extraction is one left-to-right pass over the text whose
+    cost does not grow with the size of the lexicon. Each match maps back to
+    its canonical term.
+    """
+
+    def __init__(self, surface_to_canonical: dict[str, str]):
+        self.canonical = {_normalize(s): c for s, c in surface_to_canonical.items() if s.strip()}
+        self._regex = re.compile(
+            rf"\b(?:(?P<code>{OBD_CODE_PATTERN})|(?P<term>{_trie_pattern(self.canonical)}))\b"
+        )
+
+    @classmethod
+    def from_lexicon(cls, path: str = LEXICON_PATH) -> "KeywordMatcher":
+        """
+        Build from a lexicon file with `parts`, `symptoms`, `synonyms`
+        (canonical -> variants), `qualifiers` and `qualified_parts`.
+        """
+        with open(path, encoding="utf-8") as f:
+            lexicon = json.load(f)
+
+        surfaces: dict[str, str] = {}
+        for term in lexicon.get("parts", []) + lexicon.get("symptoms", []):
+            surfaces[term] = term
+        for canonical, variants in lexicon.get("synonyms", {}).items():
+            surfaces.setdefault(canonical, canonical)
+            for variant in variants:
+                surfaces.setdefault(variant, canonical)
+
+        # "front brake pads", "rear shocks", ... map to the bare part
+        qualified = set(lexicon.get("qualified_parts", []))
+        bare = [(s, c) for s, c in surfaces.items() if c in qualified]
+        for qualifier in lexicon.get("qualifiers", []):
+            for surface, canonical in bare:
+                surfaces.setdefault(f"{qualifier} {surface}", canonical)
+
+        matcher = cls(surfaces)
+        logger.info("Compiled keyword matcher with %d surface forms from %s", len(matcher.canonical), path)
+        return matcher
+
+    def extract(self, text: str) -> list[str]:
+        """
+        Canonical terms and upper-cased OBD codes found in `text`, in order of
+        first appearance and without duplicates.
+        """
+        found = {}
+        for m in self._regex.finditer(_normalize(text)):
+            code = m.group("code")
+            found.setdefault(code.upper() if code else self.canonical[m.group("term")], None)
+        return list(found)
+
+
+@lru_cache(maxsize=1)
+def get_matcher() -> KeywordMatcher:
+    """
+    Shared matcher, compiled on first use.
+    """
+    return KeywordMatcher.from_lexicon()
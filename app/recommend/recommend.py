@@ -1,10 +1,17 @@
 import os
 import logging
 import traceback
-import pandas as pd
-import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.recommend import index_artifact
+from app.recommend.store import ProductStore, top_k as top_k_positions
+from app.recommend.vehicles import GENERIC_KEY, Fitment, Vehicle
+from app.recommend.inverted import InvertedIndex
+from app.recommend.keywords import get_matcher
 
 # --- Configuration & Logging ----------------------------------------------
 
@@ -19,79 +26,313 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Path to your CSV file (adjust if needed)
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-CSV_PATH = os.path.join(BASE_DIR, "data", "pakwheels_products.csv")
+CSV_PATH = index_artifact.CSV_PATH
+
+# Retrieval engine: "exact" scores every product sharing a query term with
+# one sparse multiply per batch; "inverted" walks posting lists per query
+# with MaxScore pruning, which pays off on very large catalogs.
+ENGINES = ("exact", "inverted")
+ENGINE = os.getenv("RECOMMEND_ENGINE", "exact")
+
+# Memory for vehicle partitions per process. Each is a private copy of its
+# columns of the shared term matrix; the least recently used are dropped
+# past this budget (the most recent one is always kept).
+PARTITION_CACHE_BYTES = int(float(os.getenv("RECOMMEND_PARTITION_CACHE_MB", "64")) * 1024 * 1024)
+
+# --- Product Index --------------------------------------------------------
+
+class Partition:
+    """
+    A slice of the index: catalog `rows` (None for the whole catalog) and
+    the term matrix restricted to them. The inverted-index view used by the
+    "inverted" engine is built on first use.
+    """
+
+    def __init__(self, rows, term_matrix):
+        self.rows = rows
+        self.term_matrix = term_matrix
+        self._inverted = None
+
+    @property
+    def inverted(self) -> InvertedIndex:
+        if self._inverted is None:
+            self._inverted = InvertedIndex(self.term_matrix)
+        return self._inverted
+
+    def to_catalog(self, local_rows: np.ndarray) -> np.ndarray:
+        return local_rows if self.rows is None else self.rows[local_rows]
+
+    @property
+    def nbytes(self) -> int:
+        tm = self.term_matrix
+        total = int(tm.data.nbytes + tm.indices.nbytes + tm.indptr.nbytes)
+        if self.rows is not None:
+            total += int(self.rows.nbytes)
+        return total
+
+
+class ProductIndex:
+    """
+    One immutable generation of the recommendation index.
+
+    `term_matrix` is the TF-IDF matrix stored terms x products (one posting
+    list per row); `store` holds the product columns in the same row order.
+    `fitment` partitions the rows by the vehicle each product fits.
+    Readers grab the current instance once and use it for the whole query, so
+    a reload swapping in a new generation never exposes a half-built index.
+    """
+
+    def __init__(self, store, vectorizer, term_matrix, fitment=None, source=None,
+                 build_id=None, build_seconds=0.0):
+        self.store = store
+        self.vectorizer = vectorizer
+        self.term_matrix = term_matrix
+        self.fitment = fitment if fitment is not None else Fitment.empty(len(store))
+        self.source = source
+        self.build_id = build_id
+        self.build_seconds = build_seconds
+        self.built_at = time.time()
+        self.generation = 0
+        self.full = Partition(None, term_matrix)
+        # Column slices of term_matrix per vehicle partition, built on first
+        # use and kept within PARTITION_CACHE_BYTES, least recently used first out.
+        self._partitions = OrderedDict()
+        self._partitions_bytes = 0
+        self._partitions_lock = threading.Lock()
+        self.partition_evictions = 0
+
+    def partition(self, key: str):
+        """
+        Return the Partition for a vehicle key, or None if no product fits
+        that vehicle.
+        """
+        with self._partitions_lock:
+            part = self._partitions.get(key)
+            if part is not None:
+                self._partitions.move_to_end(key)
+                return part
+        rows = self.fitment.rows_for(key)
+        if rows is None:
+            return None
+        rows = np.asarray(rows)
+        part = Partition(rows, self.term_matrix[:, rows].tocsr())
+        with self._partitions_lock:
+            existing = self._partitions.get(key)
+            if existing is not None:
+                return existing
+            self._partitions[key] = part
+            self._partitions_bytes += part.nbytes
+            while self._partitions_bytes > PARTITION_CACHE_BYTES and len(self._partitions) > 1:
+                _, evicted = self._partitions.popitem(last=False)
+                self._partitions_bytes -= evicted.nbytes
+                self.partition_evictions += 1
+        return part
+
+    @property
+    def empty(self) -> bool:
+        return not len(self.store) or self.vectorizer is None or self.term_matrix is None
+
+    def stats(self) -> dict:
+        store_usage = self.store.memory_usage()
+        tm = self.term_matrix
+        matrix_bytes = int(tm.data.nbytes + tm.indices.nbytes + tm.indptr.nbytes) if tm is not None else 0
+        return {
+            "generation": self.generation,
+            "build_id": self.build_id,
+            "source": self.source,
+            "built_at": self.built_at,
+            "build_seconds": round(self.build_seconds, 3),
+            "products": len(self.store),
+            "features": int(tm.shape[0]) if tm is not None else 0,
+            "nnz": int(tm.nnz) if tm is not None else 0,
+            "matrix_bytes": matrix_bytes,
+            "store_bytes": store_usage["total_bytes"],
+            "bytes_per_product": store_usage["bytes_per_product"],
+            "vehicle_partitions": len(self.fitment.keys),
+            "cached_partitions": len(self._partitions),
+            "partition_bytes": self._partitions_bytes,
+            "partition_cache_bytes": PARTITION_CACHE_BYTES,
+            "partition_evictions": self.partition_evictions,
+        }
 
 # --- Module Cache ---------------------------------------------------------
 
-_data_cache = {
-    "df": None,
-    "vectorizer": None,
-    "matrix": None
-}
+_current_index = None
+_generation = 0
+# Serializes builds; readers never take it.
+_build_lock = threading.Lock()
 
 # --- Indexing -------------------------------------------------------------
 
-def _load_and_index_from_csv():
+def _catalog_signature():
+    """
+    Identify the catalog version a fresh build would pick up: the active
+    artifact build id, if one exists, and the CSV's mtime and size, so a
+    new artifact and a changed CSV both count as a change.
+    """
+    signature = {}
+    build_dir = index_artifact.current_build_dir()
+    if build_dir is not None:
+        signature["build_id"] = os.path.basename(build_dir)
+    if os.path.exists(CSV_PATH):
+        st = os.stat(CSV_PATH)
+        signature.update(csv_mtime=st.st_mtime, csv_size=st.st_size)
+    return signature or None
+
+
+def _artifact_is_stale(source: dict) -> bool:
+    """
+    True if the CSV differs from the one the artifact was built from. Only
+    a changed mtime with the same size needs the content hash.
+    """
+    if not os.path.exists(CSV_PATH):
+        return False
+    st = os.stat(CSV_PATH)
+    if st.st_size != source["size"]:
+        return True
+    if st.st_mtime == source["mtime"]:
+        return False
+    return index_artifact.source_signature(CSV_PATH)["sha256"] != source["sha256"]
+
+
+def _load_and_index_from_csv() -> ProductIndex:
     """
     Load the pakwheels_products.csv into a DataFrame, clean & combine the text,
     and build a TF-IDF matrix.
     """
-    global _data_cache
+    started = time.perf_counter()
     try:
         logger.info("Loading products from CSV: %s", CSV_PATH)
-        df = pd.read_csv(CSV_PATH)
-
-        # Expecting columns: id, title, details, manufacturer, price, url
-        # Clean text columns
-        for col in ("title", "details", "manufacturer"):
-            if col in df.columns:
-                df[col] = (
-                    df[col]
-                    .fillna("")
-                    .astype(str)
-                    .str.replace(r"[^\w\s]", "", regex=True)
-                )
-            else:
-                df[col] = ""
-
-        # Convert price column if present
-        if "price" in df.columns:
-            df["price"] = (
-                df["price"]
-                .astype(str)
-                .str.replace(r"[^\d\.]", "", regex=True)
-                .replace("", "0")
-                .astype(float)
-            )
-        else:
-            df["price"] = 0.0
-
-        # Combine all text for TF-IDF
-        df["combined_text"] = (
-            df["title"] + " " + df["details"] + " " + df["manufacturer"]
-        ).str.lower()
+        df = index_artifact.load_products_frame(CSV_PATH)
 
         logger.info("Building TF-IDF index")
-        vect = TfidfVectorizer(
-            min_df=1,
-            max_df=0.95,
-            stop_words="english",
-            ngram_range=(1, 3),
-            max_features=10000,
-            analyzer="word"
-        )
+        vect = index_artifact.make_vectorizer()
         mat = vect.fit_transform(df["combined_text"])
 
-        _data_cache["df"] = df
-        _data_cache["vectorizer"] = vect
-        _data_cache["matrix"] = mat
-
         logger.info("Indexed %d products, %d features.", mat.shape[0], mat.shape[1])
+        return ProductIndex(
+            ProductStore.from_frame(df),
+            vect,
+            index_artifact.to_term_matrix(mat),
+            fitment=Fitment.build(df["fitment_text"]),
+            build_seconds=time.perf_counter() - started,
+        )
 
     except Exception:
         logger.error("Error indexing CSV:\n%s", traceback.format_exc())
-        _data_cache = {"df": pd.DataFrame(), "vectorizer": None, "matrix": None}
+        return ProductIndex(ProductStore.empty(), None, None)
+
+
+def _load_index_from_artifact(build_dir: str):
+    """
+    Memory-map a prebuilt index artifact. Returns None if it is unusable
+    or older than the catalog CSV.
+    """
+    started = time.perf_counter()
+    try:
+        art = index_artifact.load_artifact(build_dir)
+    except Exception:
+        logger.error("Error loading index artifact %s:\n%s", build_dir, traceback.format_exc())
+        return None
+
+    if _artifact_is_stale(art["manifest"]["source"]):
+        logger.warning(
+            "Index artifact %s was built from an older %s; indexing the CSV instead. "
+            "Rebuild the artifact to load it again.", build_dir, CSV_PATH,
+        )
+        return None
+
+    logger.info(
+        "Loaded index artifact %s: %d products, %d features.",
+        art["manifest"]["build_id"], art["manifest"]["n_products"], art["manifest"]["n_features"],
+    )
+    return ProductIndex(
+        art["store"],
+        art["vectorizer"],
+        art["term_matrix"],
+        fitment=art["fitment"],
+        build_id=art["manifest"]["build_id"],
+        build_seconds=time.perf_counter() - started,
+    )
+
+
+def _build_index() -> ProductIndex:
+    """
+    Build a new index generation, preferring the prebuilt artifact and
+    falling back to fitting from the CSV.
+    """
+    source = _catalog_signature()
+    build_dir = index_artifact.current_build_dir()
+    index = _load_index_from_artifact(build_dir) if build_dir else None
+    index = index or _load_and_index_from_csv()
+    index.source = source
+    return index
+
+
+def _swap(index: ProductIndex):
+    global _current_index, _generation
+    _generation += 1
+    index.generation = _generation
+    _current_index = index
+    stats = index.stats()
+    logger.info(
+        "Product index generation %d live: %d products, %d bytes (%.1f bytes/product), built in %.2fs.",
+        stats["generation"], stats["products"], stats["matrix_bytes"] + stats["store_bytes"],
+        stats["bytes_per_product"], stats["build_seconds"],
+    )
+
+
+def load_index():
+    """
+    Build and publish the first index generation if there is none yet.
+    Called at worker startup; safe to repeat.
+    """
+    if _current_index is not None:
+        return
+    with _build_lock:
+        if _current_index is None:
+            _swap(_build_index())
+
+
+def reload_index(force: bool = False) -> bool:
+    """
+    Rebuild the index if the catalog changed since the live generation was
+    built (or unconditionally with `force`) and swap it in atomically.
+    In-flight queries finish on the generation they started with.
+
+    Returns True if a new generation went live.
+    """
+    with _build_lock:
+        current = _current_index
+        signature = _catalog_signature()
+        if not force and current is not None and signature == current.source:
+            return False
+
+        logger.info("Catalog changed (%s); rebuilding product index.", signature)
+        index = _build_index()
+        if index.empty and current is not None and not current.empty:
+            logger.error("Rebuilt product index is empty; keeping generation %d.", current.generation)
+            return False
+        _swap(index)
+        return True
+
+
+def current_index() -> ProductIndex:
+    """
+    Return the live index generation, building the first one if needed.
+    """
+    if _current_index is None:
+        load_index()
+    return _current_index
+
+
+def index_stats() -> dict:
+    """
+    Generation, build duration and size of the live index.
+    """
+    if _current_index is None:
+        return {"generation": 0}
+    return _current_index.stats()
 
 # --- Keyword Extraction ---------------------------------------------------
 
@@ -99,58 +340,132 @@ def _extract_keywords(text: str) -> str:
     """
     Pull out automotive terms and fault codes to boost relevance.
     """
-    text_lower = text.lower()
+    return " ".join(get_matcher().extract(text))
 
-    # common parts & symptoms
-    parts = [
-        "headlight", "brake pads", "battery", "spark plugs",
-        "oil filter", "tire", "coolant", "alternator", "belt",
-        "sensor", "pump", "brake rotor", "fuse", "radiator"
-    ]
-    keywords = [p for p in parts if p in text_lower]
+# --- Scoring --------------------------------------------------------------
 
-    # OBD codes like P0420
-    codes = re.findall(r"\b[pP]\d{4}\b", text)
-    keywords.extend(codes)
+def _prepare_query(query: str) -> str:
+    """
+    Boost the raw query with extracted keywords before vectorizing.
+    """
+    return (_extract_keywords(query) + " " + query).lower()
 
-    return " ".join(keywords)
 
-# --- Public API -----------------------------------------------------------
+def _score_exact(candidates, qm, positions, part: Partition, accepts):
+    """
+    Score the query rows at `positions` against a partition with one sparse
+    multiply and append (catalog rows, scores) to each query's candidates.
+    """
+    # Only the posting lists of the query terms are read, and the result
+    # holds only products that share at least one term with the query.
+    sims = (qm[positions] @ part.term_matrix).tocsr()
+    for local, i in enumerate(positions):
+        start, end = sims.indptr[local], sims.indptr[local + 1]
+        rows = part.to_catalog(sims.indices[start:end])
+        scores = sims.data[start:end]
+        if accepts[i] is not None:
+            fits = accepts[i](rows)
+            rows, scores = rows[fits], scores[fits]
+        candidates[i].append((rows, scores))
+
 
-def recommend_products(query: str, top_k: int = 5) -> list[dict]:
+def _score_inverted(candidates, qm, positions, part: Partition, accepts, top_k: int):
     """
-    Return up to `top_k` product dicts most similar to `query`.
+    Retrieve each query's top `top_k` from a partition's posting lists.
     """
-    logger.info("Recommending for query: %s", query[:60])
-    if _data_cache["df"] is None:
-        _load_and_index_from_csv()
+    inverted = part.inverted
+    for i in positions:
+        start, end = qm.indptr[i], qm.indptr[i + 1]
+        accept = accepts[i]
+        if accept is not None and part.rows is not None:
+            accept = lambda local, _a=accept: _a(part.rows[local])
+        local, scores = inverted.search(qm.indices[start:end], qm.data[start:end], top_k, accept)
+        candidates[i].append((part.to_catalog(local), scores))
+
+
+def score_queries(queries: list[str], top_k: int = 5, vehicles=None, engine: str = None) -> list[list[dict]]:
+    """
+    Score a batch of queries against the product index and return the
+    `top_k` product dicts for each query. Products sharing no term with a
+    query are never returned for it.
 
-    df = _data_cache["df"]
-    vect = _data_cache["vectorizer"]
-    mat = _data_cache["matrix"]
+    `vehicles` optionally gives a Vehicle (or None) per query. A vehicle-scoped
+    query only scores the products fitting that vehicle plus the generic
+    partition, and drops products whose listed model years exclude its year.
 
-    if df.empty or vect is None or mat is None:
+    `engine` picks the retrieval engine (see ENGINES); both return the same
+    products. With "exact", queries sharing a partition are scored with a
+    single sparse multiply.
+
+    TfidfVectorizer L2-normalizes every row, so the dot product of the query
+    and product matrices is already the cosine similarity.
+    """
+    engine = engine or ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown recommendation engine {engine!r}; expected one of {ENGINES}")
+
+    index = current_index()
+    if index.empty:
         logger.warning("No product data available for recommendations.")
-        return []
+        return [[] for _ in queries]
 
-    try:
-        # boost with extracted keywords
-        processed = (_extract_keywords(query) + " " + query).lower()
-        qv = vect.transform([processed])
-        sims = cosine_similarity(qv, mat).flatten()
-
-        best_idxs = sims.argsort()[:-top_k - 1:-1]
-        results = []
-        for idx in best_idxs:
-            row = df.iloc[idx]
-            results.append({
-                "id": int(row.get("id", idx)),
-                "title": row.get("title", ""),
-                "manufacturer": row.get("manufacturer", ""),
-                "price": float(row.get("price", 0)),
-                "url": row.get("url", "")
-            })
+    vehicles = [Vehicle(*v) if v is not None else None for v in (vehicles or [None] * len(queries))]
+    accepts = [
+        (lambda rows, _y=int(v.year): index.fitment.fits_year(rows, _y)) if v is not None and v.year else None
+        for v in vehicles
+    ]
+    qm = index.vectorizer.transform([_prepare_query(q) for q in queries])
+    qm.sort_indices()
+    candidates = [[] for _ in queries]
 
+    # group queries by the partitions they score against
+    groups: dict[str, list[int]] = {}
+    unscoped = [i for i, v in enumerate(vehicles) if v is None]
+    scoped = [i for i, v in enumerate(vehicles) if v is not None]
+    for i in scoped:
+        groups.setdefault(vehicles[i].key, []).append(i)
+
+    work = []
+    if unscoped:
+        work.append((index.full, unscoped))
+    if scoped:
+        generic = index.partition(GENERIC_KEY)
+        if generic is not None:
+            work.append((generic, scoped))
+        for key, positions in groups.items():
+            part = index.partition(key)
+            if part is not None:
+                work.append((part, positions))
+
+    for part, positions in work:
+        if engine == "inverted":
+            _score_inverted(candidates, qm, positions, part, accepts, top_k)
+        else:
+            _score_exact(candidates, qm, positions, part, accepts)
+
+    batch_results = []
+    for parts in candidates:
+        rows = np.concatenate([r for r, _ in parts]) if parts else np.empty(0, np.int32)
+        scores = np.concatenate([d for _, d in parts]) if parts else np.empty(0)
+        if len(parts) > 1:
+            # keep ties resolving by catalog row, as with a single partition
+            order = np.argsort(rows, kind="stable")
+            rows, scores = rows[order], scores[order]
+        best = top_k_positions(scores, top_k)
+        batch_results.append(index.store.rows(rows[best]))
+
+    return batch_results
+
+# --- Public API -----------------------------------------------------------
+
+def recommend_products(query: str, top_k: int = 5, vehicle=None) -> list[dict]:
+    """
+    Return up to `top_k` product dicts most similar to `query`, restricted to
+    products fitting `vehicle` (manufacturer, model, year) when given.
+    """
+    logger.info("Recommending for query: %s", query[:60])
+    try:
+        results = score_queries([query], top_k, [vehicle])[0]
         logger.info("Returning %d recommendations.", len(results))
         return results
 
@@ -0,0 +1,153 @@
+import os
+import asyncio
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.recommend.recommend import load_index, reload_index, score_queries
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# How long the collector waits for more queries after the first one arrives.
+BATCH_WINDOW_MS = float(os.getenv("RECOMMEND_BATCH_WINDOW_MS", "5"))
+# Upper bound on queries scored together in one sparse matrix multiply.
+MAX_BATCH_SIZE = int(os.getenv("RECOMMEND_MAX_BATCH", "32"))
+# Threads that run the vectorize + score step off the event loop.
+MAX_WORKERS = int(os.getenv("RECOMMEND_WORKERS", "2"))
+# Seconds between catalog change checks; 0 disables hot reloading.
+RELOAD_INTERVAL = float(os.getenv("RECOMMEND_RELOAD_INTERVAL", "60"))
+
+# --- Service --------------------------------------------------------------
+
+class RecommendationService:
+    """
+    Async front-end for `score_queries`.
+
+    Concurrent `recommend()` calls are collected for up to `batch_window_ms`
+    (or until `max_batch_size` queries are queued) and scored together in a
+    worker thread, so a burst of N chats costs one sparse matrix multiply and
+    never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        batch_window_ms: Optional[float] = None,
+        max_batch_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        reload_interval: Optional[float] = None,
+    ):
+        self.batch_window = (BATCH_WINDOW_MS if batch_window_ms is None else batch_window_ms) / 1000.0
+        self.max_batch_size = max(1, MAX_BATCH_SIZE if max_batch_size is None else max_batch_size)
+        self.max_workers = max(1, MAX_WORKERS if max_workers is None else max_workers)
+        self.reload_interval = RELOAD_INTERVAL if reload_interval is None else reload_interval
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: set[asyncio.Task] = set()
+
+    async def start(self):
+        """
+        Start the batch collector and worker pool and warm the product index.
+        Safe to call twice.
+        """
+        if self._collector and not self._collector.done():
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="recommend"
+        )
+        self._collector = asyncio.create_task(self._collect())
+        await asyncio.get_running_loop().run_in_executor(self._executor, load_index)
+        if self.reload_interval > 0:
+            self._watcher = asyncio.create_task(self._watch())
+        logger.info(
+            "Recommendation service started (window=%.1fms, max_batch=%d, workers=%d)",
+            self.batch_window * 1000, self.max_batch_size, self.max_workers,
+        )
+
+    async def stop(self):
+        """
+        Stop collecting, finish the batches already dispatched and shut the pool down.
+        """
+        for task in (self._watcher, self._collector):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._watcher = None
+        self._collector = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._queue:
+            while not self._queue.empty():
+                *_, fut = self._queue.get_nowait()
+                if not fut.done():
+                    fut.set_result([])
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def recommend(self, query: str, top_k: int = 5, vehicle=None) -> list[dict]:
+        """
+        Return up to `top_k` product dicts most similar to `query`, restricted
+        to products fitting `vehicle` (manufacturer, model, year) when given.
+        """
+        await self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, top_k, vehicle, fut))
+        return await fut
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Score in the background so the next batch can start collecting.
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _watch(self):
+        """
+        Poll for catalog changes and rebuild on a separate thread, so neither
+        the event loop nor the scoring workers wait on a build.
+        """
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await asyncio.to_thread(reload_index)
+            except Exception:
+                logger.error("Error reloading product index:\n%s", traceback.format_exc())
+
+    async def _dispatch(self, batch: list[tuple]):
+        queries = [q for q, _, _, _ in batch]
+        vehicles = [v for _, _, v, _ in batch]
+        top_k = max(k for _, k, _, _ in batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, score_queries, queries, top_k, vehicles
+            )
+        except Exception:
+            logger.error("Error during batched recommendation:\n%s", traceback.format_exc())
+            results = [[] for _ in batch]
+
+        logger.info("Scored recommendation batch of %d queries.", len(batch))
+        for (_, k, _, fut), res in zip(batch, results):
+            if not fut.done():
+                fut.set_result(res[:k])
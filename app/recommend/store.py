@@ -0,0 +1,162 @@
+import os
+import numpy as np
+
+# --- String Column --------------------------------------------------------
+
+class StringColumn:
+    """
+    UTF-8 strings packed into one byte buffer plus an offsets array, so a
+    column of N strings costs two numpy arrays instead of N Python objects.
+    """
+
+    def __init__(self, buf: np.ndarray, offsets: np.ndarray):
+        self.buf = buf
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, values) -> "StringColumn":
+        encoded = [str(v).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        buf = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(buf, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.buf[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.buf.nbytes + self.offsets.nbytes)
+
+    def save(self, path_prefix: str):
+        np.save(path_prefix + "_buf.npy", self.buf)
+        np.save(path_prefix + "_offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, path_prefix: str, mmap_mode=None) -> "StringColumn":
+        return cls(
+            np.load(path_prefix + "_buf.npy", mmap_mode=mmap_mode),
+            np.load(path_prefix + "_offsets.npy", mmap_mode=mmap_mode),
+        )
+
+# --- Product Store --------------------------------------------------------
+
+class ProductStore:
+    """
+    Columnar product metadata: parallel arrays for id, title, manufacturer,
+    price and url, indexed by the product's row in the TF-IDF matrix.
+    """
+
+    STRING_COLUMNS = ("title", "manufacturer", "url")
+
+    def __init__(self, ids: np.ndarray, prices: np.ndarray, strings: dict):
+        self.ids = ids
+        self.prices = prices
+        self.strings = strings
+
+    @classmethod
+    def empty(cls) -> "ProductStore":
+        return cls.from_columns({})
+
+    @classmethod
+    def from_columns(cls, columns: dict) -> "ProductStore":
+        """
+        Build from plain lists keyed by column name. A missing `id` column
+        defaults to the row number, missing strings to "" and prices to 0.
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        ids = np.asarray(columns.get("id", range(n)), dtype=np.int64)
+        prices = np.asarray(columns.get("price", [0.0] * n), dtype=np.float64)
+        strings = {
+            name: StringColumn.from_list(columns.get(name, [""] * n))
+            for name in cls.STRING_COLUMNS
+        }
+        return cls(ids, prices, strings)
+
+    @classmethod
+    def from_frame(cls, df) -> "ProductStore":
+        columns = {}
+        for name in ("id", "price") + cls.STRING_COLUMNS:
+            if name in df.columns:
+                col = df[name]
+                columns[name] = col.fillna("").tolist() if name in cls.STRING_COLUMNS else col.tolist()
+        if "id" not in columns:
+            columns["id"] = list(range(len(df)))
+        return cls.from_columns(columns)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, idxs) -> list[dict]:
+        """
+        Assemble result dicts for the given row numbers.
+        """
+        title = self.strings["title"]
+        manufacturer = self.strings["manufacturer"]
+        url = self.strings["url"]
+        return [
+            {
+                "id": int(self.ids[i]),
+                "title": title[i],
+                "manufacturer": manufacturer[i],
+                "price": float(self.prices[i]),
+                "url": url[i],
+            }
+            for i in idxs
+        ]
+
+    def memory_usage(self) -> dict:
+        """
+        Bytes held by each column, in total and per product.
+        """
+        columns = {"id": int(self.ids.nbytes), "price": int(self.prices.nbytes)}
+        columns.update({name: col.nbytes for name, col in self.strings.items()})
+        total = sum(columns.values())
+        return {
+            "products": len(self),
+            "total_bytes": total,
+            "bytes_per_product": round(total / len(self), 1) if len(self) else 0.0,
+            "columns": columns,
+        }
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "id.npy"), self.ids)
+        np.save(os.path.join(directory, "price.npy"), self.prices)
+        for name, col in self.strings.items():
+            col.save(os.path.join(directory, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode=None) -> "ProductStore":
+        return cls(
+            np.load(os.path.join(directory, "id.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "price.npy"), mmap_mode=mmap_mode),
+            {
+                name: StringColumn.load(os.path.join(directory, name), mmap_mode=mmap_mode)
+                for name in cls.STRING_COLUMNS
+            },
+        )
+
+# --- Top-k Selection ------------------------------------------------------
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the `k` highest scores, best first, ties broken by position.
+    Uses an O(n) argpartition and only sorts the k survivors.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+        # argpartition is not stable; pull in every entry tied with the k-th
+        # score so ties resolve by position exactly like a full sort would.
+        kth = scores[part].min()
+        part = np.flatnonzero(scores >= kth)
+    else:
+        part = np.arange(n)
+    order = np.lexsort((part, -scores[part]))
+    return part[order][:k]
@@ -0,0 +1,181 @@
+import os
+import re
+import json
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# --- Configuration --------------------------------------------------------
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+VEHICLE_MODELS_PATH = os.getenv(
+    "VEHICLE_MODELS_PATH", os.path.join(ROOT_DIR, "data", "vehicle_models.json")
+)
+
+# Key of the partition holding products that name no specific vehicle.
+GENERIC_KEY = "*"
+
+# Year ranges as written in listings: "2014-2020", "2014 to 20", "2009~2013".
+_YEAR_RANGE_RE = re.compile(r"\b((?:19|20)\d{2})\s*(?:-|–|to|~)\s*((?:19|20)\d{2}|\d{2})\b")
+_YEAR_RE = re.compile(r"\b((?:19[5-9]|20[0-4])\d)\b")
+
+# --- Helpers --------------------------------------------------------------
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(text).lower()).split())
+
+
+def vehicle_key(manufacturer: str, model: str) -> str:
+    """
+    Partition key for a vehicle, e.g. ("Honda", "CR-V") -> "honda/cr v".
+    """
+    return f"{_normalize(manufacturer)}/{_normalize(model)}"
+
+
+class Vehicle(NamedTuple):
+    manufacturer: str
+    model: str
+    year: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return vehicle_key(self.manufacturer, self.model)
+
+
+def parse_years(text: str) -> tuple[int, int]:
+    """
+    Return the (first, last) model year a listing mentions, or (0, 0).
+    """
+    years = []
+    for start, end in _YEAR_RANGE_RE.findall(text):
+        first = int(start)
+        last = int(end) if len(end) == 4 else first // 100 * 100 + int(end)
+        if 1950 <= first <= last <= 2049:
+            years.extend((first, last))
+    if not years:
+        years = [int(y) for y in _YEAR_RE.findall(text)]
+    return (min(years), max(years)) if years else (0, 0)
+
+# --- Tagging --------------------------------------------------------------
+
+class FitmentTagger:
+    """
+    Tags product text with the vehicles it fits, using the make/model list in
+    data/vehicle_models.json. Models listed under `require_make` are common
+    words ("City", "Every") and only count when the make is named too.
+    """
+
+    def __init__(self, models_path: str = VEHICLE_MODELS_PATH):
+        with open(models_path, encoding="utf-8") as f:
+            catalog = json.load(f)
+
+        self._models: dict[str, list[tuple[str, bool]]] = {}
+        for make, spec in catalog.items():
+            require = {_normalize(m) for m in spec.get("require_make", [])}
+            for model in spec["models"]:
+                norm = _normalize(model)
+                self._models.setdefault(norm, []).append((_normalize(make), norm in require))
+
+        alternation = "|".join(re.escape(m) for m in sorted(self._models, key=len, reverse=True))
+        self._model_re = re.compile(rf"\b({alternation})\b")
+
+    def tag(self, text: str) -> set[str]:
+        """
+        Return the vehicle keys named in `text`.
+        """
+        norm = _normalize(text)
+        padded = f" {norm} "
+        keys = set()
+        for model in set(self._model_re.findall(norm)):
+            for make, require_make in self._models[model]:
+                if not require_make or f" {make} " in padded:
+                    keys.add(f"{make}/{model}")
+        return keys
+
+# --- Fitment Partitions ---------------------------------------------------
+
+class Fitment:
+    """
+    Vehicle partitions over a catalog: the product rows per vehicle key, the
+    generic rows that name no vehicle, and each product's model-year range
+    (0 where unknown).
+    """
+
+    def __init__(self, keys: list[str], indptr: np.ndarray, rows: np.ndarray,
+                 year_min: np.ndarray, year_max: np.ndarray):
+        self.keys = keys
+        self.indptr = indptr
+        self.rows = rows
+        self.year_min = year_min
+        self.year_max = year_max
+        self._positions = {k: i for i, k in enumerate(keys)}
+
+    @classmethod
+    def build(cls, texts, tagger: Optional[FitmentTagger] = None) -> "Fitment":
+        tagger = tagger or FitmentTagger()
+        groups: dict[str, list[int]] = {}
+        year_min, year_max = [], []
+        for row, text in enumerate(texts):
+            tags = tagger.tag(text) or {GENERIC_KEY}
+            for key in tags:
+                groups.setdefault(key, []).append(row)
+            first, last = parse_years(text)
+            year_min.append(first)
+            year_max.append(last)
+
+        keys = sorted(groups)
+        indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(groups[k]) for k in keys], out=indptr[1:])
+        rows = np.concatenate([np.asarray(groups[k], dtype=np.int32) for k in keys]) if keys else np.empty(0, np.int32)
+        return cls(keys, indptr, rows, np.asarray(year_min, np.int16), np.asarray(year_max, np.int16))
+
+    @classmethod
+    def empty(cls, n_products: int = 0) -> "Fitment":
+        """
+        Every product in the generic partition, no year information.
+        """
+        rows = np.arange(n_products, dtype=np.int32)
+        zeros = np.zeros(n_products, dtype=np.int16)
+        return cls([GENERIC_KEY], np.array([0, n_products], dtype=np.int64), rows, zeros, zeros.copy())
+
+    def rows_for(self, key: str) -> Optional[np.ndarray]:
+        """
+        Product rows in the partition for `key`, or None if there is none.
+        """
+        pos = self._positions.get(key)
+        if pos is None:
+            return None
+        return self.rows[self.indptr[pos]:self.indptr[pos + 1]]
+
+    def fits_year(self, rows: np.ndarray, year: int) -> np.ndarray:
+        """
+        Boolean mask over `rows`: True unless the product's listed year range
+        excludes `year`.
+        """
+        lo = self.year_min[rows]
+        hi = self.year_max[rows]
+        return (lo == 0) | ((lo <= year) & (year <= hi))
+
+    def sizes(self) -> dict:
+        return {k: int(self.indptr[i + 1] - self.indptr[i]) for i, k in enumerate(self.keys)}
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "keys.json"), "w", encoding="utf-8") as f:
+            json.dump(self.keys, f)
+        np.save(os.path.join(directory, "indptr.npy"), self.indptr)
+        np.save(os.path.join(directory, "rows.npy"), self.rows)
+        np.save(os.path.join(directory, "year_min.npy"), self.year_min)
+        np.save(os.path.join(directory, "year_max.npy"), self.year_max)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode=None) -> "Fitment":
+        with open(os.path.join(directory, "keys.json"), encoding="utf-8") as f:
+            keys = json.load(f)
+        return cls(
+            keys,
+            np.load(os.path.join(directory, "indptr.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "rows.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "year_min.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "year_max.npy"), mmap_mode=mmap_mode),
+        )
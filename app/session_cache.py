@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# Sessions whose context is kept in memory; the least recently used go first.
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+# Entries older than this are reloaded, bounding how long a write made by
+# another worker process can go unseen.
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "600"))
+
+# --- Entries --------------------------------------------------------------
+
+class CachedMessage(NamedTuple):
+    id: int
+    role: str
+    content: str
+    timestamp: Optional[datetime] = None
+
+
+class CachedSession:
+    """
+    What a chat turn needs of a session: the ChatSession fields it reads
+    and the messages not yet folded into the summary, oldest first.
+    `message_count` counts all of the session's messages, summarized ones
+    included.
+    """
+
+    __slots__ = (
+        "id", "user_id", "manufacturer", "model", "year", "summary", "summary_message_id",
+        "messages", "message_count", "loaded_at",
+    )
+
+    def __init__(self, session, messages: list, message_count: Optional[int] = None):
+        self.id = session.id
+        self.user_id = session.user_id
+        self.manufacturer = session.manufacturer
+        self.model = session.model
+        self.year = session.year
+        self.summary = session.summary
+        self.summary_message_id = session.summary_message_id
+        self.messages = [CachedMessage(m.id, m.role, m.content, m.timestamp) for m in messages]
+        self.message_count = len(self.messages) if message_count is None else message_count
+        self.loaded_at = time.monotonic()
+        self._prune()
+
+    def _prune(self):
+        if self.summary_message_id is not None:
+            self.messages = [m for m in self.messages if m.id > self.summary_message_id]
+
+# --- Cache ----------------------------------------------------------------
+
+class SessionCache:
+    """
+    LRU of CachedSession by session id, updated as messages and summaries
+    are written, so a turn in an active session reads nothing from the
+    database. Writers report every change through the `note_*` methods and
+    `invalidate*`; a load that overlaps a write to the same session is not
+    stored, since it may have missed it.
+
+    Entries are per process and invalidations do not reach other workers,
+    so a turn's first write re-checks the owner in the database (main.py,
+    `_count_message`) instead of trusting `user_id` here.
+    """
+
+    def __init__(self, max_entries: int = SESSION_CACHE_SIZE, ttl_seconds: float = SESSION_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict[str, CachedSession] = OrderedDict()
+        # session id -> [loads in progress, written to since they started]
+        self._loading: dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, session_id: str) -> Optional[CachedSession]:
+        entry = self._entries.get(session_id)
+        if entry is not None and time.monotonic() - entry.loaded_at > self.ttl:
+            del self._entries[session_id]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return entry
+
+    def start_load(self, session_id: str):
+        """
+        Mark a database load of the session as begun; pair with `finish_load`.
+        """
+        state = self._loading.setdefault(session_id, [0, False])
+        state[0] += 1
+
+    def finish_load(self, entry: Optional[CachedSession], session_id: str) -> Optional[CachedSession]:
+        """
+        Store a loaded entry unless the session was written meanwhile.
+        """
+        state = self._loading[session_id]
+        state[0] -= 1
+        written = state[1]
+        if state[0] == 0:
+            del self._loading[session_id]
+        if entry is not None and not written and self.enabled:
+            self._put(entry)
+        return entry
+
+    def _put(self, entry: CachedSession):
+        self._entries[entry.id] = entry
+        self._entries.move_to_end(entry.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _written(self, session_id: str):
+        state = self._loading.get(session_id)
+        if state is not None:
+            state[1] = True
+
+    def prime(self, session, messages: list):
+        """
+        Cache a session created by this process, with its first messages.
+        """
+        if self.enabled:
+            self._put(CachedSession(session, messages))
+
+    def note_message(self, session_id: str, message, message_count: Optional[int] = None):
+        """
+        A message was committed to the session. `message_count`, when the
+        write returned it, is the session's count after the insert; a
+        mismatch means another process wrote too and the entry is dropped.
+        """
+        self._written(session_id)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        if message_count is not None and message_count != entry.message_count + 1:
+            self.stale += 1
+            self.invalidate(session_id)
+            return
+        entry.messages.append(CachedMessage(message.id, message.role, message.content, message.timestamp))
+        entry.message_count += 1
+
+    def note_summary(self, session_id: str, summary: str, summary_message_id: int):
+        self._written(session_id)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        entry.summary = summary
+        entry.summary_message_id = summary_message_id
+        entry._prune()
+
+    def invalidate(self, session_id: str):
+        self._written(session_id)
+        if self._entries.pop(session_id, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: str):
+        for session_id in [sid for sid, e in self._entries.items() if e.user_id == user_id]:
+            self.invalidate(session_id)
+        for session_id in self._loading:
+            self._written(session_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale": self.stale,
+        }
@@ -0,0 +1,73 @@
+import logging
+
+from sqlalchemy import func, select, update
+
+from app.models import ChatSession, Message
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration --------------------------------------------------------
+
+# Characters of the latest message kept for history listings.
+PREVIEW_CHARS = 200
+
+# --- Maintenance ----------------------------------------------------------
+
+def messages_added(session_id: str, last: Message, count: int = 1):
+    """
+    UPDATE for `count` new messages in a session, `last` being the newest.
+    Execute it in the transaction that inserts the messages.
+    """
+    return (
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(
+            message_count=func.coalesce(ChatSession.message_count, 0) + count,
+            last_message_preview=last.content[:PREVIEW_CHARS],
+            last_activity_at=last.timestamp,
+        )
+        # loaded ChatSession objects keep their values; nothing reads them after
+        .execution_options(synchronize_session=False)
+    )
+
+
+def backfill_session_stats(sync_conn) -> int:
+    """
+    Fill the stats of sessions written before they were maintained: one
+    pass over messages grouped by session, joined back in a single UPDATE
+    ... FROM, then the sessions without messages. Run with
+    `conn.run_sync(backfill_session_stats)`, after the messages index exists.
+    """
+    stats = (
+        select(
+            Message.session_id,
+            func.count().label("message_count"),
+            func.max(Message.timestamp).label("last_at"),
+            # ids grow with insertion, so the largest is the latest message
+            func.max(Message.id).label("last_id"),
+        )
+        .group_by(Message.session_id)
+        .subquery()
+    )
+    res = sync_conn.execute(
+        update(ChatSession)
+        .where(
+            ChatSession.message_count.is_(None),
+            ChatSession.id == stats.c.session_id,
+            Message.id == stats.c.last_id,
+        )
+        .values(
+            message_count=stats.c.message_count,
+            last_message_preview=func.substr(Message.content, 1, PREVIEW_CHARS),
+            last_activity_at=stats.c.last_at,
+        )
+    )
+    empty = sync_conn.execute(
+        update(ChatSession)
+        .where(ChatSession.message_count.is_(None))
+        .values(message_count=0, last_activity_at=ChatSession.created_at)
+    )
+    count = res.rowcount + empty.rowcount
+    if count:
+        logger.info("Backfilled message stats for %d sessions", count)
+    return count
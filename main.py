@@ -1,28 +1,43 @@
 import os
+import asyncio
 import logging
 import uuid
 import json
 from datetime import datetime, timezone
+from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Request, Form, File, UploadFile, Depends
+from fastapi import FastAPI, HTTPException, Request, Form, File, UploadFile, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.background import BackgroundTask
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc, func
+from sqlalchemy import desc, update
+from sqlalchemy.orm import defer
 
 # your modules
 from app.llm.diagnose_llm import DiagnoseLLM
-from app.recommend.recommend import recommend_products
+from app.llm.context import build_context, clean_content, message_tokens, CONTEXT_TOKEN_BUDGET
+from app.recommend.service import RecommendationService
+from app.recommend.recommend import index_stats
+from app.admission import AdmissionController, Ticket
+from app.metrics import REGISTRY, MetricsMiddleware, instrument_pool, span
 from app.auth.google import router as auth_router, get_current_user, UserInfo
-from app.database import get_db, engine, Base
+from app.database import get_db, engine, AsyncSessionLocal, pool_stats
 from app.models import ChatSession, Message
+from app.session_stats import messages_added
+from app.session_cache import SessionCache, CachedSession
+from app.history_purge import HistoryPurger, clear_user_history
+from app.migrations import migrate
+from app.pagination import (
+    HISTORY_PAGE_SIZE, MESSAGES_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, before, page,
+)
 
 # load env
 load_dotenv()
@@ -59,6 +74,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# request and stage timings for /metrics and the Server-Timing header
+app.add_middleware(MetricsMiddleware)
+
 # include auth routes
 app.include_router(auth_router)
 
@@ -69,6 +87,51 @@ templates = Jinja2Templates(directory="templates")
 # initialize your LLM
 diagnose_llm = DiagnoseLLM()
 
+# batched product recommendations, scored off the event loop
+recommendation_service = RecommendationService()
+
+# per-user rate limits and a bounded queue in front of the chat endpoints
+chat_admission = AdmissionController()
+
+# conversation context of active sessions, kept current as messages are written
+session_cache = SessionCache()
+
+# deletes large cleared histories after clear-history has returned
+history_purger = HistoryPurger()
+
+# metrics read from the services at scrape time
+instrument_pool(engine)
+REGISTRY.counter(
+    "diagnosis_cache_lookups_total", "Diagnosis cache lookups by result", ("result",),
+    fn=lambda: {(k,): v for k, v in diagnose_llm.cache.stats().items() if k in ("hits", "misses")},
+)
+REGISTRY.gauge("diagnosis_cache_hit_ratio", "Share of diagnosis cache lookups that hit",
+               fn=lambda: diagnose_llm.cache.stats()["hit_rate"])
+REGISTRY.gauge("diagnosis_cache_entries", "Diagnoses held in memory",
+               fn=lambda: diagnose_llm.cache.stats()["entries"])
+REGISTRY.counter("diagnosis_coalesced_total", "Diagnosis requests served by a call already in flight",
+                 fn=lambda: diagnose_llm.flights.stats()["coalesced"])
+REGISTRY.gauge("llm_circuit_open", "1 while the LLM circuit breaker is open",
+               fn=lambda: int(diagnose_llm.breaker.state == "open"))
+REGISTRY.counter(
+    "session_cache_lookups_total", "Session context cache lookups by result", ("result",),
+    fn=lambda: {(k,): v for k, v in session_cache.stats().items() if k in ("hits", "misses")},
+)
+REGISTRY.counter("session_cache_invalidations_total", "Session context cache entries dropped",
+                 fn=lambda: session_cache.invalidations)
+REGISTRY.gauge("session_cache_entries", "Sessions with their context in memory",
+               fn=lambda: session_cache.stats()["entries"])
+REGISTRY.gauge("chat_admission_active", "Chat turns in flight", fn=lambda: chat_admission.active)
+REGISTRY.gauge("chat_admission_waiting", "Chat turns waiting for a slot", fn=lambda: chat_admission.waiting)
+REGISTRY.counter(
+    "chat_admission_rejected_total", "Chat turns turned away, by reason", ("reason",),
+    fn=lambda: {
+        ("rate_limited",): chat_admission.rate_limited,
+        ("queue_full",): chat_admission.queue_full,
+        ("queue_timeout",): chat_admission.queue_timeouts,
+    },
+)
+
 # pydantic schemas
 class CarDetails(BaseModel):
     manufacturer: str
@@ -83,12 +146,23 @@ class TextSizeRequest(BaseModel):
     session_id: str
     size: str
 
-# create tables on startup
+# create tables and apply pending migrations on startup
 @app.on_event("startup")
 async def on_startup():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("Database tables created")
+        applied = await conn.run_sync(migrate)
+    logger.info("Database schema up to date (applied migrations: %s)", applied or "none")
+    history_purger.kick()
+    await recommendation_service.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    pending = list(_pending_products.values()) + list(_summary_tasks.values()) + list(_orphan_saves)
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    await history_purger.aclose()
+    await recommendation_service.stop()
+    await diagnose_llm.aclose()
 
 # root
 @app.get("/")
@@ -113,8 +187,9 @@ async def create_new_session(
             year=car_details.year,
         )
         db.add(db_session)
-        await db.commit()
-        await db.refresh(db_session)
+        with span("commit"):
+            await db.commit()
+            await db.refresh(db_session)
 
         # initial system message
         system_msg = Message(
@@ -137,8 +212,11 @@ async def create_new_session(
             timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
         )
         db.add(welcome_msg)
+        await db.execute(messages_added(session_id, welcome_msg, count=2))
 
-        await db.commit()
+        with span("commit"):
+            await db.commit()
+        session_cache.prime(db_session, [system_msg, welcome_msg])
 
         logger.info(f"Created session {session_id}")
         return {"session_id": session_id, "car_details": car_details}
@@ -147,6 +225,100 @@ async def create_new_session(
         logger.error(f"Error creating session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# load the session and a token-budgeted context for a new user message and
+# persist the message; active sessions come from the session cache
+async def _start_turn(chat_req: ChatRequest, user: UserInfo, db: AsyncSession):
+    session = session_cache.get(chat_req.session_id)
+    if session is None:
+        session = await _load_session(chat_req.session_id, db)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.user_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    # summary + recent turns + the new message, within the token budget
+    with span("context"):
+        context = build_context(session.messages, chat_req.message, session.summary, session.summary_message_id)
+
+    # persist user message
+    user_msg = Message(
+        session_id=session.id,
+        role="user",
+        content=chat_req.message,
+        timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
+    )
+    # the stats update runs first and checks the owner again: a cached
+    # session may have been cleared meanwhile by another worker
+    message_count = await _count_message(db, session.id, user_msg, owner_id=user.id)
+    db.add(user_msg)
+    with span("commit"):
+        await db.commit()
+    session_cache.note_message(session.id, user_msg, message_count)
+    return session, context
+
+
+async def _load_session(session_id: str, db: AsyncSession) -> Optional[CachedSession]:
+    """
+    Read a session and the messages its summary does not cover yet, and
+    cache them.
+    """
+    session_cache.start_load(session_id)
+    entry = None
+    try:
+        with span("session_lookup"):
+            res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
+            session = res.scalars().first()
+        if not session:
+            return None
+
+        with span("history_query"):
+            query = select(Message).where(Message.session_id == session.id)
+            if session.summary_message_id is not None:
+                query = query.where(Message.id > session.summary_message_id)
+            msg_res = await db.execute(query.order_by(Message.timestamp, Message.id))
+            history = msg_res.scalars().all()
+        entry = CachedSession(session, history, session.message_count)
+        return entry
+    finally:
+        session_cache.finish_load(entry, session_id)
+
+
+async def _count_message(db: AsyncSession, session_id: str, message: Message,
+                         owner_id: Optional[str] = None) -> Optional[int]:
+    """
+    Update the session's message stats for a new message; returns the new
+    message count where the database can report it in the same statement.
+    With `owner_id`, a session no longer owned by that user (cleared or
+    deleted) is not updated: it is dropped from the session cache and the
+    request fails with 404.
+    """
+    stmt = messages_added(session_id, message)
+    if owner_id is not None:
+        stmt = stmt.where(ChatSession.user_id == owner_id)
+    if db.bind.dialect.update_returning:
+        row = (await db.execute(stmt.returning(ChatSession.message_count))).first()
+        matched, message_count = row is not None, row[0] if row is not None else None
+    else:
+        matched, message_count = (await db.execute(stmt)).rowcount > 0, None
+    if not matched:
+        await db.rollback()
+        session_cache.invalidate(session_id)
+        raise HTTPException(status_code=404, detail="Session not found")
+    return message_count
+
+
+# start product retrieval alongside the LLM call, seeded from the user's
+# message and the session vehicle
+def _start_products(message: str, session: ChatSession) -> asyncio.Task:
+    return asyncio.create_task(_recommend(message, session))
+
+
+async def _recommend(message: str, session: ChatSession) -> list:
+    with span("recommend"):
+        return await recommendation_service.recommend(
+            message, top_k=3, vehicle=(session.manufacturer, session.model, session.year)
+        )
+
 # chat endpoint
 @app.post("/api/chat")
 async def chat(
@@ -154,66 +326,276 @@ async def chat(
     user: UserInfo = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
+    with span("admission"):
+        ticket = await chat_admission.acquire(user.id)
     try:
-        # load session
-        res = await db.execute(select(ChatSession).where(ChatSession.id == chat_req.session_id))
-        session = res.scalars().first()
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
-        if session.user_id != user.id:
-            raise HTTPException(status_code=403, detail="Not authorized")
-
-        # fetch history
-        msg_res = await db.execute(
-            select(Message).where(Message.session_id == session.id).order_by(Message.timestamp)
-        )
-        history = msg_res.scalars().all()
+        return await _chat_turn(chat_req, user, db)
+    finally:
+        ticket.release()
 
-        # build messages list
-        messages = [{"role": m.role, "content": m.content} for m in history]
-        messages.append({"role": "user", "content": chat_req.message})
 
-        # persist user message
-        user_msg = Message(
+async def _chat_turn(chat_req: ChatRequest, user: UserInfo, db: AsyncSession):
+    try:
+        # committed before the LLM call so no transaction is held open across it
+        session, context = await _start_turn(chat_req, user, db)
+        products_task = _start_products(chat_req.message, session)
+        try:
+            with span("diagnosis"):
+                diagnosis = await diagnose_llm.get_diagnosis(context.messages, session)
+        except BaseException:
+            products_task.cancel()
+            raise
+
+        # persist assistant message; products that are not ready yet are
+        # attached in the background and fetched via /api/messages/{id}/products
+        products_ready = products_task.done()
+        products = products_task.result() if products_ready else None
+        assist_msg = Message(
             session_id=session.id,
-            role="user",
-            content=chat_req.message,
+            role="assistant",
+            content=diagnosis,
             timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
+            products=json.dumps(products) if products_ready else None,
         )
-        db.add(user_msg)
-        await db.flush()
-
-        # get diagnosis & recommendations
-        diagnosis = await diagnose_llm.get_diagnosis(messages, session)
-        products = recommend_products(diagnosis, top_k=3)
-
-        # prepare assistant reply
-        assist_content = diagnosis
-        if products:
-            assist_content += "\n\n**Recommended Products:**\n"
-            for idx, p in enumerate(products, 1):
-                assist_content += (
-                    f"{idx}. {p['title']} by {p['manufacturer']} (${p['price']})\n"
-                    f"   URL: {p['url']}\n"
-                )
+        db.add(assist_msg)
+        message_count = await _count_message(db, session.id, assist_msg)
+        with span("commit"):
+            await db.commit()
+        session_cache.note_message(session.id, assist_msg, message_count)
+
+        if not products_ready:
+            _track_pending_products(assist_msg.id, products_task)
+        _schedule_summary(session, context.to_summarize)
+
+        return {
+            "message": diagnosis,
+            "message_id": assist_msg.id,
+            "products": products,
+            "products_pending": not products_ready,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# streaming chat endpoint: Server-Sent Events with `token` events carrying
+# reply text as it is generated, then one `done` event
+@app.post("/api/chat/stream")
+async def chat_stream(
+    chat_req: ChatRequest,
+    user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # the slot is held until the stream ends
+    with span("admission"):
+        ticket = await chat_admission.acquire(user.id)
+    try:
+        session, context = await _start_turn(chat_req, user, db)
+
+    except HTTPException:
+        ticket.release()
+        raise
+    except Exception as e:
+        ticket.release()
+        logger.error(f"Chat stream error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # persist assistant message
+    products_task = _start_products(chat_req.message, session)
+    return StreamingResponse(
+        _stream_reply(session, context, products_task, ticket),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # also covers a client that leaves before the stream starts
+        background=BackgroundTask(ticket.release),
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_reply(session: ChatSession, context, products_task: asyncio.Task, ticket: Ticket):
+    """
+    Forward the diagnosis as it streams, then persist it. A reply cut short
+    by the client disconnecting is persisted with the text sent so far.
+    """
+    parts = []
+    completed = False
+    try:
+        with span("diagnosis"):
+            async for text in diagnose_llm.stream_diagnosis(context.messages, session):
+                parts.append(text)
+                yield _sse("token", {"text": text})
+        completed = True
+    finally:
+        ticket.release()
+        if not completed:
+            products_task.cancel()
+        if parts:
+            # shielded so a disconnect cannot interrupt the write
+            saved = asyncio.ensure_future(
+                _save_reply(session.id, "".join(parts), products_task if completed else None)
+            )
+            if not completed:
+                _track_orphan_save(session.id, saved)
+            else:
+                message_id, products, products_ready = await asyncio.shield(saved)
+                _schedule_summary(session, context.to_summarize)
+                yield _sse("done", {
+                    "message_id": message_id,
+                    "products": products,
+                    "products_pending": not products_ready,
+                })
+
+
+async def _save_reply(session_id: str, content: str, products_task: Optional[asyncio.Task]):
+    """
+    Persist a streamed assistant reply, with its products if they are ready.
+    """
+    products_ready = products_task is not None and products_task.done()
+    products = products_task.result() if products_ready else None
+    async with AsyncSessionLocal() as db:
         assist_msg = Message(
-            session_id=session.id,
+            session_id=session_id,
             role="assistant",
-            content=assist_content,
+            content=content,
             timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
-            products=json.dumps(products) if products else None,
+            products=json.dumps(products) if products_ready else None,
         )
         db.add(assist_msg)
+        message_count = await _count_message(db, session_id, assist_msg)
         await db.commit()
+    session_cache.note_message(session_id, assist_msg, message_count)
+    if products_task is not None and not products_ready:
+        _track_pending_products(assist_msg.id, products_task)
+    return assist_msg.id, products, products_ready
+
+# replies saved after their client disconnected, which nothing awaits
+_orphan_saves: set[asyncio.Task] = set()
+
+
+def _track_orphan_save(session_id: str, task: asyncio.Task):
+    _orphan_saves.add(task)
+    task.add_done_callback(lambda t: _orphan_save_done(session_id, t))
+
+
+def _orphan_save_done(session_id: str, task: asyncio.Task):
+    _orphan_saves.discard(task)
+    # e.g. a 404 from _count_message when the session was cleared mid-stream
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Saving disconnected reply for session {session_id} failed: {task.exception()!r}")
+
+# rolling conversation summaries being updated, by session id
+_summary_tasks: dict[str, asyncio.Task] = {}
+
+
+def _schedule_summary(session: ChatSession, to_summarize: list):
+    if not to_summarize or session.id in _summary_tasks:
+        return
+    task = asyncio.create_task(_fold_summary(
+        session.id, session.summary, session.summary_message_id,
+        [(m.id, {"role": m.role, "content": clean_content(m.content)}) for m in to_summarize],
+    ))
+    _summary_tasks[session.id] = task
+    task.add_done_callback(lambda _: _summary_tasks.pop(session.id, None))
+
+
+async def _fold_summary(session_id: str, summary: Optional[str], summarized_through: Optional[int], messages: list):
+    """
+    Fold messages that left the verbatim window into the session summary,
+    a token-budget sized chunk per LLM call.
+    """
+    try:
+        while messages:
+            chunk, used = [], 0
+            while messages and (not chunk or used + message_tokens(messages[0][1]) <= CONTEXT_TOKEN_BUDGET):
+                used += message_tokens(messages[0][1])
+                chunk.append(messages.pop(0))
+
+            new_summary = await diagnose_llm.summarize(summary, [m for _, m in chunk])
+            if not new_summary:
+                return
+            last_id = chunk[-1][0]
+            async with AsyncSessionLocal() as db:
+                # only advance from the summary this fold started from
+                current = (
+                    ChatSession.summary_message_id.is_(None) if summarized_through is None
+                    else ChatSession.summary_message_id == summarized_through
+                )
+                res = await db.execute(
+                    update(ChatSession)
+                    .where(ChatSession.id == session_id, current)
+                    .values(summary=new_summary, summary_message_id=last_id)
+                )
+                await db.commit()
+            if res.rowcount == 0:
+                return
+            session_cache.note_summary(session_id, new_summary, last_id)
+            summary, summarized_through = new_summary, last_id
+    except Exception as e:
+        logger.error(f"Summary error for session {session_id}: {e}")
+
+# products attached after the reply was sent
+_pending_products: dict[int, asyncio.Task] = {}
+
+# how long an assistant message without products may still be waiting on them
+PRODUCTS_PENDING_SECONDS = 30
+
 
-        return {"message": assist_content, "products": products}
+def _track_pending_products(message_id: int, products_task: asyncio.Task):
+    task = asyncio.create_task(_attach_products(message_id, products_task))
+    _pending_products[message_id] = task
+    task.add_done_callback(lambda _: _pending_products.pop(message_id, None))
+
+
+async def _attach_products(message_id: int, products_task: asyncio.Task):
+    """
+    Wait for the recommendations of a sent reply and store them on its Message.
+    """
+    try:
+        products = await products_task
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Message).where(Message.id == message_id).values(products=json.dumps(products))
+            )
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Attach products error for message {message_id}: {e}")
+
+# products for a reply
+@app.get("/api/messages/{message_id}/products")
+async def get_message_products(
+    message_id: int,
+    user: UserInfo = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        with span("message_query"):
+            res = await db.execute(
+                select(Message, ChatSession.user_id)
+                .join(ChatSession, ChatSession.id == Message.session_id)
+                .where(Message.id == message_id)
+            )
+            row = res.first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Message not found")
+        msg, owner = row
+        if owner != user.id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+
+        if msg.products is not None:
+            return {"message_id": msg.id, "products": json.loads(msg.products), "pending": False}
+
+        age = (datetime.now(timezone.utc).replace(tzinfo=None) - msg.timestamp).total_seconds()
+        pending = message_id in _pending_products or (msg.role == "assistant" and age < PRODUCTS_PENDING_SECONDS)
+        return {"message_id": msg.id, "products": None, "pending": pending}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.error(f"Message products error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # set text size
@@ -224,15 +606,17 @@ async def set_text_size(
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        res = await db.execute(select(ChatSession).where(ChatSession.id == req.session_id))
-        session = res.scalars().first()
+        with span("session_lookup"):
+            res = await db.execute(select(ChatSession).where(ChatSession.id == req.session_id))
+            session = res.scalars().first()
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         if session.user_id != user.id:
             raise HTTPException(status_code=403, detail="Not authorized")
 
         session.text_size = req.size
-        await db.commit()
+        with span("commit"):
+            await db.commit()
         return {"success": True}
 
     except HTTPException:
@@ -241,64 +625,83 @@ async def set_text_size(
         logger.error(f"Text-size error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# history listing
+# history listing, newest first; pass `next_cursor` as `before` for older sessions
 @app.get("/api/history")
 async def get_history(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before_cursor: Optional[str] = Query(None, alias="before"),
     user: UserInfo = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        res = await db.execute(
+        # message stats are kept on the session, so one query serves the page
+        query = (
             select(ChatSession)
+            .options(defer(ChatSession.summary))
             .where(ChatSession.user_id == user.id)
-            .order_by(desc(ChatSession.created_at))
+            .order_by(desc(ChatSession.created_at), desc(ChatSession.id))
+            .limit(limit + 1)
         )
-        sessions = res.scalars().all()
+        if before_cursor:
+            query = query.where(before(ChatSession.created_at, ChatSession.id, before_cursor))
+        with span("sessions_query"):
+            res = await db.execute(query)
+            sessions, next_cursor = page(
+                res.scalars().all(), limit, lambda s: encode_cursor(s.created_at, s.id)
+            )
 
         out = []
         for s in sessions:
-            last = (await db.execute(
-                select(Message)
-                .where(Message.session_id == s.id)
-                .order_by(desc(Message.timestamp))
-                .limit(1)
-            )).scalars().first()
-            count = await db.scalar(
-                select(func.count()).select_from(Message).where(Message.session_id == s.id)
-            )
             out.append({
                 "id": s.id,
                 "car_details": {"manufacturer": s.manufacturer, "model": s.model, "year": s.year},
                 "created_at": s.created_at.isoformat(),
-                "last_message": last.content if last else "",
-                "message_count": count,
+                "last_message": s.last_message_preview or "",
+                "message_count": s.message_count or 0,
+                "last_activity_at": s.last_activity_at.isoformat() if s.last_activity_at else None,
             })
 
-        return {"sessions": out}
+        return {"sessions": out, "next_cursor": next_cursor}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"History error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# fetch one session
+# fetch one session with its newest messages (in chronological order); pass
+# `next_cursor` as `before` for the page of messages before them
 @app.get("/api/history/{session_id}")
 async def get_session_history(
     session_id: str,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before_cursor: Optional[str] = Query(None, alias="before"),
     user: UserInfo = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
-        session = res.scalars().first()
+        with span("session_lookup"):
+            res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
+            session = res.scalars().first()
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         if session.user_id != user.id:
             raise HTTPException(status_code=403, detail="Not authorized")
 
-        msg_res = await db.execute(
-            select(Message).where(Message.session_id == session.id).order_by(Message.timestamp)
+        query = (
+            select(Message)
+            .where(Message.session_id == session.id)
+            .order_by(desc(Message.timestamp), desc(Message.id))
+            .limit(limit + 1)
         )
-        msgs = msg_res.scalars().all()
+        if before_cursor:
+            query = query.where(before(Message.timestamp, Message.id, before_cursor))
+        with span("history_query"):
+            msg_res = await db.execute(query)
+            msgs, next_cursor = page(
+                msg_res.scalars().all(), limit, lambda m: encode_cursor(m.timestamp, m.id)
+            )
+        msgs.reverse()
 
         return {
             "id": session.id,
@@ -311,12 +714,14 @@ async def get_session_history(
             "text_size": session.text_size,
             "messages": [
                 {
+                    "id": m.id,
                     "role": m.role,
                     "content": m.content,
                     "timestamp": m.timestamp.isoformat(),
                     "products": json.loads(m.products) if m.products else None
                 } for m in msgs
             ],
+            "next_cursor": next_cursor,
         }
 
     except HTTPException:
@@ -332,17 +737,58 @@ async def clear_history(
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        res = await db.execute(select(ChatSession).where(ChatSession.user_id == user.id))
-        sessions = res.scalars().all()
-        for s in sessions:
-            await db.delete(s)
-        await db.commit()
-        return {"success": True}
+        with span("delete"):
+            cleared = await clear_user_history(db, user.id)
+        session_cache.invalidate_user(user.id)
+        if cleared["background"]:
+            history_purger.kick()
+        return {"success": True, **cleared}
 
     except Exception as e:
         logger.error(f"Clear history error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# recommendation index status
+@app.get("/api/recommend/stats")
+async def recommend_stats():
+    return index_stats()
+
+# diagnosis cache counters
+@app.get("/api/diagnosis/cache/stats")
+async def diagnosis_cache_stats():
+    return diagnose_llm.cache.stats()
+
+# chat admission: slots in use, queue and rejections
+@app.get("/api/chat/admission/stats")
+async def chat_admission_stats():
+    return chat_admission.stats()
+
+# session context cache: entries, hit rate and invalidations
+@app.get("/api/session/cache/stats")
+async def session_cache_stats():
+    return session_cache.stats()
+
+# database connection pool: connections in use, checkout times and timeouts
+@app.get("/api/db/pool/stats")
+async def db_pool_stats():
+    return pool_stats()
+
+# background purge of cleared histories
+@app.get("/api/history/purge/stats")
+async def history_purge_stats():
+    return history_purger.stats()
+
+# diagnosis cache and request coalescing counters
+@app.get("/api/diagnosis/stats")
+async def diagnosis_stats():
+    return diagnose_llm.stats()
+
+# Prometheus metrics: request and stage latency, LLM calls and tokens,
+# DB pool, caches and admission
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # image upload
 @app.post("/api/upload-image")
 async def upload_image(
@@ -352,8 +798,9 @@ async def upload_image(
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
-        session = res.scalars().first()
+        with span("session_lookup"):
+            res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
+            session = res.scalars().first()
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         if session.user_id != user.id:
@@ -361,8 +808,9 @@ async def upload_image(
 
         os.makedirs("static/uploads", exist_ok=True)
         path = f"static/uploads/{session_id}_{file.filename}"
-        with open(path, "wb") as f:
-            f.write(await file.read())
+        with span("write_file"):
+            with open(path, "wb") as f:
+                f.write(await file.read())
 
         return {"success": True, "file_url": f"/{path}"}
 
@@ -0,0 +1,296 @@
+"""
+Seed a large synthetic chat history and measure the hot history queries
+before and after the index migrations.
+
+The tables are created without their secondary indexes and seeded with
+users, sessions and messages. The script records EXPLAIN plans and latency
+percentiles for the query shapes main.py runs, applies the migrations in
+app/migrations.py (indexes and the session stats backfill, timed), then
+measures again. Results go to one JSON file. Needs
+DATABASE_URL pointing at an empty database.
+
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python scripts/bench_history_queries.py
+    DATABASE_URL=postgresql+asyncpg://localhost/bench python scripts/bench_history_queries.py --users 5000
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import platform
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_catalog import CatalogGenerator
+
+import numpy as np
+from sqlalchemy import desc, func, insert, inspect, select, text
+
+ASSISTANT_REPLY = (
+    "Based on your description, here is how to diagnose it: 1. Scan for stored trouble codes. "
+    "2. Inspect the related components for wear, leaks or loose connections. 3. Check fuses, "
+    "relays and connectors for corrosion. 4. Road test the vehicle and confirm the symptom."
+)
+INSERT_CHUNK = 5000
+
+
+def _percentiles(samples: list[float]) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "unknown"
+
+# --- Schema and Data ------------------------------------------------------
+
+def create_unindexed(sync_conn):
+    """
+    Create the tables as the app did before the index migrations.
+    """
+    from app.database import Base
+
+    if inspect(sync_conn).has_table("chat_sessions") and sync_conn.execute(
+        text("SELECT 1 FROM chat_sessions LIMIT 1")
+    ).first():
+        raise SystemExit("DATABASE_URL must point at an empty database")
+    Base.metadata.create_all(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(sync_conn, checkfirst=True)
+
+
+def seed(sync_conn, users: int, sessions: int, messages: int, seed: int) -> dict:
+    """
+    Insert `users` users with about `sessions` sessions each, and about
+    `messages` messages per session, spread over the past year. Session
+    message stats are left for the backfill migration.
+    """
+    from app.models import ChatSession, Message
+
+    rng = random.Random(seed)
+    gen = CatalogGenerator(seed)
+    now = datetime.utcnow()
+    session_rows, message_rows = [], []
+    counts = {"sessions": 0, "messages": 0}
+
+    def flush(force=False):
+        if not force and len(message_rows) < INSERT_CHUNK:
+            return
+        # sessions first: messages reference them
+        if session_rows:
+            sync_conn.execute(insert(ChatSession), session_rows)
+            counts["sessions"] += len(session_rows)
+            session_rows.clear()
+        if message_rows:
+            sync_conn.execute(insert(Message), message_rows)
+            counts["messages"] += len(message_rows)
+            message_rows.clear()
+
+    session_no = 0
+    for u in range(users):
+        for _ in range(max(1, int(rng.uniform(0.5, 1.5) * sessions))):
+            session_no += 1
+            session_id = f"bench-session-{session_no:08d}"
+            text_, (make, model, year) = gen.query()
+            at = now - timedelta(days=rng.uniform(0, 365))
+            n = max(2, int(rng.uniform(0.5, 1.5) * messages))
+            session_rows.append({
+                "id": session_id, "user_id": f"bench-user-{u:06d}",
+                "manufacturer": make, "model": model, "year": year, "created_at": at,
+                # stats unset, as in a database from before they were kept:
+                # the migrations backfill them
+                "message_count": None,
+            })
+            for i in range(n):
+                role = "assistant" if i % 2 else "user"
+                message_rows.append({
+                    "session_id": session_id, "role": role,
+                    "content": ASSISTANT_REPLY if role == "assistant" else text_,
+                    "timestamp": at + timedelta(minutes=i),
+                })
+            flush()
+    flush(force=True)
+    return counts
+
+# --- Queries --------------------------------------------------------------
+
+def query_shapes(sync_conn, rng: random.Random, samples: int) -> dict:
+    """
+    Statement builders for the queries of the history and chat endpoints,
+    each drawing a random user or session from the seeded data.
+    """
+    from app.models import ChatSession, Message
+    from app.pagination import HISTORY_PAGE_SIZE, MESSAGES_PAGE_SIZE, before, encode_cursor
+
+    sessions = sync_conn.execute(
+        select(ChatSession.id, ChatSession.user_id, ChatSession.created_at)
+        .order_by(func.random()).limit(samples)
+    ).all()
+
+    def history_page():
+        return (
+            select(ChatSession).where(ChatSession.user_id == rng.choice(sessions).user_id)
+            .order_by(desc(ChatSession.created_at), desc(ChatSession.id)).limit(HISTORY_PAGE_SIZE + 1)
+        )
+
+    def history_older_page():
+        s = rng.choice(sessions)
+        return (
+            select(ChatSession)
+            .where(ChatSession.user_id == s.user_id,
+                   before(ChatSession.created_at, ChatSession.id, encode_cursor(s.created_at, s.id)))
+            .order_by(desc(ChatSession.created_at), desc(ChatSession.id)).limit(HISTORY_PAGE_SIZE + 1)
+        )
+
+    def transcript_page():
+        return (
+            select(Message).where(Message.session_id == rng.choice(sessions).id)
+            .order_by(desc(Message.timestamp), desc(Message.id)).limit(MESSAGES_PAGE_SIZE + 1)
+        )
+
+    def chat_context():
+        return select(Message).where(Message.session_id == rng.choice(sessions).id).order_by(Message.timestamp)
+
+    def user_sessions():
+        return select(ChatSession).where(ChatSession.user_id == rng.choice(sessions).user_id)
+
+    return {
+        "history_page": history_page,
+        "history_older_page": history_older_page,
+        "transcript_page": transcript_page,
+        "chat_context": chat_context,
+        "clear_history_sessions": user_sessions,
+    }
+
+
+def explain(sync_conn, stmt) -> list[str]:
+    dialect = sync_conn.dialect
+    compiled = stmt.compile(dialect=dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if dialect.name == "sqlite":
+        rows = sync_conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+        return [row[-1] for row in rows]
+    prefix = "EXPLAIN (ANALYZE, BUFFERS)" if dialect.name == "postgresql" else "EXPLAIN"
+    return [str(row[0]) for row in sync_conn.exec_driver_sql(f"{prefix} {compiled}", params).all()]
+
+
+def measure(sync_conn, shapes: dict, runs: int) -> dict:
+    results = {}
+    for name, build in shapes.items():
+        plan = explain(sync_conn, build())
+        timings = []
+        for _ in range(runs):
+            stmt = build()
+            started = time.perf_counter()
+            sync_conn.execute(stmt).all()
+            timings.append(time.perf_counter() - started)
+        results[name] = {"plan": plan, "latency": _percentiles(timings)}
+    return results
+
+# --- Driver ---------------------------------------------------------------
+
+async def run(args) -> dict:
+    from app.database import engine
+    from app.migrations import migrate
+
+    async with engine.begin() as conn:
+        await conn.run_sync(create_unindexed)
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        counts = await conn.run_sync(seed, args.users, args.sessions, args.messages, args.seed)
+        await conn.execute(text("ANALYZE"))
+    seed_seconds = time.perf_counter() - started
+    print(f"seeded {counts['sessions']} sessions, {counts['messages']} messages in {seed_seconds:.1f}s")
+
+    rng = random.Random(args.seed)
+    async with engine.connect() as conn:
+        shapes = await conn.run_sync(query_shapes, rng, args.samples)
+        before_results = await conn.run_sync(measure, shapes, args.runs)
+
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        applied = await conn.run_sync(migrate)
+        await conn.execute(text("ANALYZE"))
+    migrate_seconds = time.perf_counter() - started
+    print(f"applied migrations {applied} in {migrate_seconds:.1f}s")
+
+    async with engine.connect() as conn:
+        after_results = await conn.run_sync(measure, shapes, args.runs)
+    await engine.dispose()
+
+    return {
+        "dialect": engine.dialect.name,
+        "rows": counts,
+        "seed_seconds": round(seed_seconds, 2),
+        "migrations_applied": applied,
+        "migrate_seconds": round(migrate_seconds, 2),
+        "runs": args.runs,
+        "queries": {
+            name: {"before": before_results[name], "after": after_results[name]} for name in shapes
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure history queries before and after the index migrations.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=20, help="average sessions per user")
+    parser.add_argument("--messages", type=int, default=20, help="average messages per session")
+    parser.add_argument("--runs", type=int, default=200, help="executions per query shape and phase")
+    parser.add_argument("--samples", type=int, default=1000, help="sessions to draw query parameters from")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="result file (default bench_results/history-queries-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        parser.error("set DATABASE_URL, e.g. sqlite+aiosqlite:///bench.db")
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args))
+
+    for name, phases in result["queries"].items():
+        a, b = phases["before"], phases["after"]
+        print(f"== {name}")
+        print(f"  p50 {a['latency']['p50_ms']}ms -> {b['latency']['p50_ms']}ms, "
+              f"p95 {a['latency']['p95_ms']}ms -> {b['latency']['p95_ms']}ms")
+        print(f"  plan before: {' | '.join(a['plan'][:3])}")
+        print(f"  plan after:  {' | '.join(b['plan'][:3])}")
+
+    commit = _git_commit()
+    out = args.out or os.path.join(
+        ROOT_DIR, "bench_results", f"history-queries-{commit}-{time.strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({
+            "benchmark": "history_queries",
+            "commit": commit,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **result,
+        }, f, indent=2)
+    print(f"wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark the product recommender on synthetic catalogs.
+
+For each catalog size it measures the offline index build, artifact load,
+peak RSS, per-query latency percentiles for each retrieval engine and batched
+throughput, then writes one JSON file per run. Every size runs in a fresh
+process so peak RSS is not inflated by earlier sizes. Runs fully offline.
+
+    python scripts/bench_recommend.py --sizes 1000 10000 100000
+    python scripts/bench_recommend.py --sizes 1000000 --queries 200
+    python scripts/bench_recommend.py --compare bench_results/a.json bench_results/b.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import resource
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_catalog import CatalogGenerator
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentiles(samples: list[float]) -> dict:
+    import numpy as np
+
+    ms = np.asarray(samples) * 1000
+    return {
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p90_ms": round(float(np.percentile(ms, 90)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def run_size(size: int, n_queries: int, top_k: int, batch_size: int, seed: int) -> dict:
+    """
+    Benchmark one catalog size. Runs inside a fresh worker process.
+    """
+    workdir = tempfile.mkdtemp(prefix=f"bench-recommend-{size}-")
+    try:
+        return _run_size(workdir, size, n_queries, top_k, batch_size, seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_size(workdir: str, size: int, n_queries: int, top_k: int, batch_size: int, seed: int) -> dict:
+    os.environ["RECOMMEND_INDEX_DIR"] = os.path.join(workdir, "index")
+    os.chdir(ROOT_DIR)
+    logging.disable(logging.INFO)
+
+    from app.recommend import index_artifact
+    import app.recommend.recommend as recommend
+
+    csv_path = os.path.join(workdir, "products.csv")
+    gen = CatalogGenerator(seed)
+    started = time.perf_counter()
+    gen.write_csv(csv_path, size)
+    generate_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index_artifact.build_artifact(csv_path, os.environ["RECOMMEND_INDEX_DIR"])
+    build_seconds = time.perf_counter() - started
+    build_rss = _peak_rss_mb()
+
+    recommend.CSV_PATH = csv_path
+    started = time.perf_counter()
+    recommend.reload_index(force=True)
+    load_seconds = time.perf_counter() - started
+
+    queries = [gen.query() for _ in range(n_queries)]
+    # warm the keyword matcher and vehicle partitions
+    recommend.score_queries([q for q, _ in queries], top_k, [v for _, v in queries])
+
+    latency = {}
+    for engine in recommend.ENGINES:
+        for scoped in (False, True):
+            samples = []
+            for text, vehicle in queries:
+                started = time.perf_counter()
+                recommend.score_queries([text], top_k, [vehicle if scoped else None], engine=engine)
+                samples.append(time.perf_counter() - started)
+            latency[f"{engine}{'_scoped' if scoped else ''}"] = _percentiles(samples)
+
+    throughput = {}
+    for engine in recommend.ENGINES:
+        started = time.perf_counter()
+        for i in range(0, n_queries, batch_size):
+            chunk = queries[i:i + batch_size]
+            recommend.score_queries([q for q, _ in chunk], top_k, [v for _, v in chunk], engine=engine)
+        throughput[engine] = round(n_queries / (time.perf_counter() - started), 1)
+
+    stats = recommend.index_stats()
+    return {
+        "products": size,
+        "generate_seconds": round(generate_seconds, 3),
+        "build_seconds": round(build_seconds, 3),
+        "load_seconds": round(load_seconds, 4),
+        "peak_rss_build_mb": build_rss,
+        "peak_rss_mb": _peak_rss_mb(),
+        "index": {k: stats[k] for k in ("features", "nnz", "matrix_bytes", "store_bytes", "bytes_per_product")},
+        "latency": latency,
+        "batched_qps": throughput,
+        "batch_size": batch_size,
+        "queries": n_queries,
+        "top_k": top_k,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(old_path: str, new_path: str):
+    """
+    Print per-size changes between two result files.
+    """
+    with open(old_path) as f:
+        old = {r["products"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {r["products"]: r for r in json.load(f)["results"]}
+
+    def delta(a, b):
+        return f"{a:>10} -> {b:<10} ({(b - a) / a * 100:+.1f}%)" if a else f"{a} -> {b}"
+
+    for size in sorted(old.keys() & new.keys()):
+        a, b = old[size], new[size]
+        print(f"== {size} products")
+        print(f"  build_seconds      {delta(a['build_seconds'], b['build_seconds'])}")
+        print(f"  peak_rss_mb        {delta(a['peak_rss_mb'], b['peak_rss_mb'])}")
+        for name in sorted(a["latency"].keys() & b["latency"].keys()):
+            print(f"  {name + ' p99_ms':<18} {delta(a['latency'][name]['p99_ms'], b['latency'][name]['p99_ms'])}")
+        for name in sorted(a["batched_qps"].keys() & b["batched_qps"].keys()):
+            print(f"  {name + ' qps':<18} {delta(a['batched_qps'][name], b['batched_qps'][name])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the product recommender.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="result file (default bench_results/recommend-<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for size in args.sizes:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_size, (size, args.queries, args.top_k, args.batch_size, args.seed))
+        results.append(result)
+        lat = result["latency"]
+        print(
+            f"{size:>9} products: build {result['build_seconds']:.2f}s, "
+            f"rss {result['peak_rss_mb']}MB, "
+            + ", ".join(f"{k} p50 {v['p50_ms']}ms p99 {v['p99_ms']}ms" for k, v in lat.items())
+            + ", " + ", ".join(f"{k} {v} q/s" for k, v in result["batched_qps"].items())
+        )
+
+    commit = _git_commit()
+    out = args.out or os.path.join(
+        ROOT_DIR, "bench_results", f"recommend-{commit}-{time.strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({
+            "benchmark": "recommend",
+            "commit": commit,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": vars(args),
+            "results": results,
+        }, f, indent=2)
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Offline stand-in for the Groq chat-completions API, for load tests.
+
+Serves POST /openai/v1/chat/completions (plain and streaming) from
+app.llm.backends.StubBackend, so the real Groq client, connection pool and
+timeouts are exercised without network access or API quota. Latency, token
+rate and error rate come from the LLM_STUB_* variables or the flags below.
+
+    python scripts/llm_stub_server.py --port 8900 --latency lognormal:600:0.5 --error-rate 0.01
+    GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=stub uvicorn main:app
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from typing import Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.llm.backends import (
+    StubBackend, StreamUsage, LLMError, LLM_STUB_LATENCY, LLM_STUB_TOKENS_PER_SECOND, LLM_STUB_ERROR_RATE,
+)
+
+
+def create_app(backend: StubBackend) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+
+    def _error(message: str) -> JSONResponse:
+        return JSONResponse(
+            status_code=503,
+            content={"error": {"message": message, "type": "service_unavailable"}},
+        )
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        max_tokens = body.get("max_tokens") or 1024
+        model = body.get("model", backend.model)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            try:
+                completion = await backend.complete(messages, max_tokens=max_tokens)
+            except LLMError as e:
+                return _error(str(e))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": completion.text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": completion.prompt_tokens,
+                    "completion_tokens": completion.completion_tokens,
+                    "total_tokens": completion.prompt_tokens + completion.completion_tokens,
+                },
+            }
+
+        # fail before the first byte, like the provider does
+        usage = StreamUsage()
+        stream = backend.stream(messages, max_tokens=max_tokens, usage=usage)
+        try:
+            first = await stream.__anext__()
+        except LLMError as e:
+            return _error(str(e))
+        except StopAsyncIteration:
+            first = None
+
+        def chunk(delta: Optional[dict], finish_reason=None, **extra) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }) + "\n\n"
+
+        async def events():
+            if first is not None:
+                yield chunk({"role": "assistant", "content": first})
+                async for piece in stream:
+                    yield chunk({"content": piece})
+            yield chunk({}, "stop")
+            # with stream_options.include_usage, usage follows in a chunk of its own
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, usage={
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens,
+                    "total_tokens": usage.prompt_tokens + usage.completion_tokens,
+                })
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stub Groq chat-completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default=LLM_STUB_LATENCY,
+                        help="time to first token: constant:MS, uniform:MS:MS or lognormal:MEDIAN_MS:SIGMA")
+    parser.add_argument("--tokens-per-second", type=float, default=LLM_STUB_TOKENS_PER_SECOND)
+    parser.add_argument("--error-rate", type=float, default=LLM_STUB_ERROR_RATE)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    backend = StubBackend(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(backend), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
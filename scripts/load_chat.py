@@ -0,0 +1,140 @@
+"""
+Drive the chat endpoints at a given concurrency against the stub LLM backend.
+
+The app is served by uvicorn on a local port inside this process, with
+authentication stubbed out, so the whole request path (HTTP, session lookup,
+context building, diagnosis cache, LLM backend, recommendations,
+persistence) is exercised on a laptop without network access. Needs
+DATABASE_URL, e.g. sqlite+aiosqlite:///load.db or a local Postgres.
+
+    python scripts/load_chat.py --sessions 50 --requests 1000 --concurrency 100
+    python scripts/load_chat.py --stream --concurrency 200
+    LLM_STUB_LATENCY=uniform:200:2000 LLM_STUB_ERROR_RATE=0.02 python scripts/load_chat.py
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)
+os.environ.setdefault("LLM_BACKEND", "stub")
+# every request comes from one user; per-user rate limits would reject most
+os.environ.setdefault("CHAT_RATE_PER_MINUTE", "0")
+
+from synthetic_catalog import CatalogGenerator
+
+import numpy as np
+import httpx
+import uvicorn
+
+
+def _percentiles(samples: list[float]) -> str:
+    if not samples:
+        return "n/a"
+    ms = np.asarray(samples) * 1000
+    return " ".join(f"p{p} {np.percentile(ms, p):.0f}ms" for p in (50, 90, 99)) + f" max {ms.max():.0f}ms"
+
+
+async def _chat(client: httpx.AsyncClient, session_id: str, message: str, stream: bool) -> tuple:
+    """
+    One chat turn; returns (status, total seconds, seconds to first token).
+    """
+    started = time.perf_counter()
+    body = {"session_id": session_id, "message": message}
+    if not stream:
+        resp = await client.post("/api/chat", json=body)
+        elapsed = time.perf_counter() - started
+        return resp.status_code, elapsed, elapsed
+
+    first = None
+    async with client.stream("POST", "/api/chat/stream", json=body) as resp:
+        async for line in resp.aiter_lines():
+            if first is None and line.startswith("event: token"):
+                first = time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+    return resp.status_code, elapsed, first if first is not None else elapsed
+
+
+async def run(args):
+    logging.disable(logging.WARNING)
+    import main
+    from app.auth.google import get_current_user, UserInfo
+
+    main.app.dependency_overrides[get_current_user] = lambda: UserInfo(
+        id="load-test", email="load@test.local", name="Load Test"
+    )
+    server = uvicorn.Server(uvicorn.Config(
+        main.app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="on"
+    ))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+
+    gen = CatalogGenerator(args.seed)
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits
+        ) as client:
+            sessions = []
+            for _ in range(args.sessions):
+                text, (make, model, year) = gen.query()
+                resp = await client.post("/api/session", json={"manufacturer": make, "model": model, "year": year})
+                resp.raise_for_status()
+                sessions.append(resp.json()["session_id"])
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            results = []
+
+            async def one():
+                async with semaphore:
+                    text, _ = gen.query()
+                    results.append(await _chat(client, rng.choice(sessions), text, args.stream))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(args.requests)))
+            wall = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        await serving
+
+    ok = [r for r in results if r[0] == 200]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"{len(results)} requests in {wall:.1f}s ({len(results) / wall:.1f} req/s), concurrency {args.concurrency}")
+    print(f"  status counts: {statuses}")
+    print(f"  latency: {_percentiles([r[1] for r in ok])}")
+    if args.stream:
+        print(f"  time to first token: {_percentiles([r[2] for r in ok])}")
+    print(f"  admission: {main.chat_admission.stats()}")
+    print(f"  db pool: {main.pool_stats()}")
+    print(f"  diagnosis: {main.diagnose_llm.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the chat endpoints in-process.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream and report time to first token")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        parser.error("set DATABASE_URL, e.g. sqlite+aiosqlite:///load.db")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
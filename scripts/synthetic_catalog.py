@@ -0,0 +1,89 @@
+"""
+Synthetic product catalogs and chat queries for offline benchmarks.
+
+Rows follow the pakwheels_products.csv schema (id, title, details,
+manufacturer, price, url) and draw part names from data/automotive_lexicon.json
+and vehicles from data/vehicle_models.json, so tokenization, fitment tagging
+and keyword extraction behave like they do on the real scrape.
+"""
+import os
+import csv
+import json
+import random
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BRANDS = [
+    "Bosch", "Denso", "NGK", "Exide", "Mobil", "Valeo", "Aisin", "KYB", "Brembo",
+    "Mann", "Mahle", "Gates", "Shell", "Total", "AGS", "Osaka", "Guard", "Genuine",
+]
+ADJECTIVES = [
+    "premium", "genuine", "heavy duty", "long life", "oem quality", "high performance",
+    "imported", "original", "japanese", "ceramic", "synthetic", "reinforced",
+]
+
+
+def _load(name: str) -> dict:
+    with open(os.path.join(ROOT_DIR, "data", name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class CatalogGenerator:
+    """
+    Deterministic generator of catalog rows and queries for a given seed.
+    """
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        lexicon = _load("automotive_lexicon.json")
+        self.parts = lexicon["parts"]
+        self.symptoms = lexicon["symptoms"]
+        self.vehicles = [
+            (make, model)
+            for make, spec in _load("vehicle_models.json").items()
+            for model in spec["models"]
+        ]
+
+    def product(self, idx: int) -> dict:
+        rng = self.rng
+        part = rng.choice(self.parts)
+        brand = rng.choice(BRANDS)
+        if rng.random() < 0.8:
+            make, model = rng.choice(self.vehicles)
+            first = rng.randint(1995, 2022)
+            fitment = f" for {make} {model} {first}-{first + rng.randint(1, 7)}"
+        else:
+            fitment = ""
+        return {
+            "id": idx,
+            "title": f"{brand} {part.title()}{fitment}",
+            "details": f"{rng.choice(ADJECTIVES)} {part} {rng.choice(ADJECTIVES)} replacement part",
+            "manufacturer": brand,
+            "price": f"PKR {rng.randint(300, 150000):,}",
+            "url": f"https://www.pakwheels.com/accessories-spare-parts/{idx}",
+        }
+
+    def write_csv(self, path: str, n: int):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["id", "title", "details", "manufacturer", "price", "url"])
+            writer.writeheader()
+            for i in range(n):
+                writer.writerow(self.product(i))
+
+    def texts(self, n: int) -> list[str]:
+        rows = (self.product(i) for i in range(n))
+        return [f"{r['title']} {r['details']} {r['manufacturer']}".lower() for r in rows]
+
+    def query(self) -> tuple[str, tuple]:
+        """
+        A chat-style diagnosis text and the session vehicle it came from.
+        """
+        rng = self.rng
+        make, model = rng.choice(self.vehicles)
+        parts = rng.sample(self.parts, rng.randint(1, 3))
+        text = (
+            f"Your {model} shows {rng.choice(self.symptoms)}. "
+            f"Check the {', '.join(parts)} and replace if worn. "
+            f"Code P0{rng.randint(100, 999)} may be stored."
+        )
+        return text, (make, model, rng.randint(1995, 2025))
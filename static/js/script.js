@@ -84,6 +84,10 @@ document.addEventListener("DOMContentLoaded", () => {
 
   // State variables
   let currentSessionId = localStorage.getItem("currentSessionId") || null
+  // cursors of the next (older) pages of the history list and the open transcript
+  let historyCursor = null
+  let messagesCursor = null
+  let loadingOlder = false
   let selectedManufacturer = null
   let selectedModel = null
   let selectedYear = null
@@ -464,6 +468,7 @@ function startChatFromManualInput() {
         chatTitleText.textContent = `${year} ${manufacturer} ${model}`
 
         chatMessages.innerHTML = ""
+        messagesCursor = null
 
         addMessage(
           "assistant",
@@ -557,31 +562,7 @@ function startChatFromManualInput() {
     isProcessing = true
     addTypingIndicator()
 
-    fetch("/api/chat", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({
-        session_id: currentSessionId,
-        message: message,
-      }),
-      credentials: "include", // Important for auth cookies
-    })
-      .then((response) => {
-        if (!response.ok) {
-          if (response.status === 401) {
-            throw new Error("Authentication required")
-          }
-          throw new Error(`HTTP error! Status: ${response.status}`)
-        }
-        return response.json()
-      })
-      .then((data) => {
-        removeTypingIndicator()
-        addMessage("assistant", data.message, new Date(), null, data.products)
-        isProcessing = false
-      })
+    streamChat(message)
       .catch((error) => {
         console.error("Error sending message:", error)
         removeTypingIndicator()
@@ -589,6 +570,13 @@ function startChatFromManualInput() {
         if (error.message === "Authentication required") {
           showNotification("Your session has expired. Please sign in again.", "error")
           handleLogin()
+        } else if (error.message === "Busy") {
+          showNotification(
+            error.rateLimited
+              ? `You're sending messages too quickly. Please wait ${error.retryAfter}s and try again.`
+              : `The service is busy right now. Please try again in ${error.retryAfter}s.`,
+            "error",
+          )
         } else {
           addMessage(
             "assistant",
@@ -597,11 +585,98 @@ function startChatFromManualInput() {
           )
           showNotification("Failed to send message. Please try again.", "error")
         }
-
+      })
+      .finally(() => {
         isProcessing = false
       })
   }
 
+  // Stream the reply from /api/chat/stream (Server-Sent Events), rendering
+  // text as it arrives
+  async function streamChat(message) {
+    const response = await fetch("/api/chat/stream", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        session_id: currentSessionId,
+        message: message,
+      }),
+      credentials: "include", // Important for auth cookies
+    })
+    if (!response.ok) {
+      if (response.status === 401) {
+        throw new Error("Authentication required")
+      }
+      if (response.status === 429 || response.status === 503) {
+        const error = new Error("Busy")
+        error.retryAfter = parseInt(response.headers.get("Retry-After"), 10) || 5
+        error.rateLimited = response.status === 429
+        throw error
+      }
+      throw new Error(`HTTP error! Status: ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ""
+    let text = ""
+    let messageDiv = null
+
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      let boundary
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const rawEvent = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+
+        let event = "message"
+        let data = ""
+        rawEvent.split("\n").forEach((line) => {
+          if (line.startsWith("event: ")) event = line.slice(7)
+          else if (line.startsWith("data: ")) data += line.slice(6)
+        })
+        if (!data) continue
+        const payload = JSON.parse(data)
+
+        if (event === "token") {
+          text += payload.text
+          if (!messageDiv) {
+            removeTypingIndicator()
+            messageDiv = addMessage("assistant", text, new Date())
+          } else {
+            const contentDiv = messageDiv.querySelector(".message-content")
+            const timestampDiv = contentDiv.querySelector(".message-timestamp")
+            contentDiv.innerHTML = text.replace(/\n/g, "<br>")
+            contentDiv.appendChild(timestampDiv)
+            chatMessages.scrollTop = chatMessages.scrollHeight
+          }
+        } else if (event === "done" && messageDiv) {
+          const triggerWords = ["product", "recommend", "part", "tool", "suggest"]
+          if (
+            payload.products &&
+            payload.products.length > 0 &&
+            triggerWords.some((kw) => message.toLowerCase().includes(kw))
+          ) {
+            const contentDiv = messageDiv.querySelector(".message-content")
+            const timestampDiv = contentDiv.querySelector(".message-timestamp")
+            contentDiv.insertBefore(createProductsContainer(payload.products), timestampDiv)
+          } else if (payload.products_pending && payload.message_id) {
+            pollProducts(payload.message_id, messageDiv, message)
+          }
+        }
+      }
+    }
+
+    if (!messageDiv) {
+      throw new Error("Empty reply")
+    }
+  }
+
   // Add message to chat
   function addMessage(role, content, timestamp, carImage = null, products = null) {
     const messageDiv = document.createElement("div")
@@ -657,62 +732,90 @@ function startChatFromManualInput() {
     const lastUserMessage = chatMessages.querySelector(".message.user:last-child .message-content")?.textContent || ""
 
     if (products && products.length > 0 && triggerWords.some((kw) => lastUserMessage.toLowerCase().includes(kw))) {
-      const productsContainer = document.createElement("div")
-      productsContainer.className = "products-container"
+      contentDiv.appendChild(createProductsContainer(products))
+    }
 
-      const productsTitle = document.createElement("div")
-      productsTitle.className = "products-title"
-      productsTitle.innerHTML = '<i class="fas fa-shopping-cart"></i> Recommended Products'
-      productsContainer.appendChild(productsTitle)
+    const timestampDiv = document.createElement("div")
+    timestampDiv.className = "message-timestamp"
+    timestampDiv.textContent = formatTimestamp(timestamp)
 
-      products.forEach((product) => {
-        const productItem = document.createElement("div")
-        productItem.className = "product-item"
+    messageDiv.appendChild(avatarDiv)
+    messageDiv.appendChild(contentDiv)
+    contentDiv.appendChild(timestampDiv)
 
-        const productInfo = document.createElement("div")
-        productInfo.className = "product-info"
+    chatMessages.appendChild(messageDiv)
+    chatMessages.scrollTop = chatMessages.scrollHeight
+    return messageDiv
+  }
 
-        const productTitle = document.createElement("div")
-        productTitle.className = "product-title"
-        productTitle.textContent = product.title
+  // Build the recommended products list for a message
+  function createProductsContainer(products) {
+    const productsContainer = document.createElement("div")
+    productsContainer.className = "products-container"
 
-        const productCategory = document.createElement("div")
-        productCategory.className = "product-category"
-        productCategory.textContent = product.manufacturer || "Auto Parts"
+    const productsTitle = document.createElement("div")
+    productsTitle.className = "products-title"
+    productsTitle.innerHTML = '<i class="fas fa-shopping-cart"></i> Recommended Products'
+    productsContainer.appendChild(productsTitle)
 
-        productInfo.appendChild(productTitle)
-        productInfo.appendChild(productCategory)
+    products.forEach((product) => {
+      const productItem = document.createElement("div")
+      productItem.className = "product-item"
 
-        const productPrice = document.createElement("div")
-        productPrice.className = "product-price"
-        productPrice.textContent = `PKR ${product.price.toFixed(2)}`
+      const productInfo = document.createElement("div")
+      productInfo.className = "product-info"
 
-        productItem.appendChild(productInfo)
-        productItem.appendChild(productPrice)
+      const productTitle = document.createElement("div")
+      productTitle.className = "product-title"
+      productTitle.textContent = product.title
 
-        if (product.url) {
-          productItem.addEventListener("click", () => {
-            window.open(product.url, "_blank")
-          })
-          productItem.style.cursor = "pointer"
-        }
+      const productCategory = document.createElement("div")
+      productCategory.className = "product-category"
+      productCategory.textContent = product.manufacturer || "Auto Parts"
 
-        productsContainer.appendChild(productItem)
-      })
+      productInfo.appendChild(productTitle)
+      productInfo.appendChild(productCategory)
 
-      contentDiv.appendChild(productsContainer)
-    }
+      const productPrice = document.createElement("div")
+      productPrice.className = "product-price"
+      productPrice.textContent = `PKR ${product.price.toFixed(2)}`
 
-    const timestampDiv = document.createElement("div")
-    timestampDiv.className = "message-timestamp"
-    timestampDiv.textContent = formatTimestamp(timestamp)
+      productItem.appendChild(productInfo)
+      productItem.appendChild(productPrice)
 
-    messageDiv.appendChild(avatarDiv)
-    messageDiv.appendChild(contentDiv)
-    contentDiv.appendChild(timestampDiv)
+      if (product.url) {
+        productItem.addEventListener("click", () => {
+          window.open(product.url, "_blank")
+        })
+        productItem.style.cursor = "pointer"
+      }
 
-    chatMessages.appendChild(messageDiv)
-    chatMessages.scrollTop = chatMessages.scrollHeight
+      productsContainer.appendChild(productItem)
+    })
+
+    return productsContainer
+  }
+
+  // Products for a reply can arrive after the reply itself; poll for them
+  function pollProducts(messageId, messageDiv, lastUserMessage, attempt = 0) {
+    const triggerWords = ["product", "recommend", "part", "tool", "suggest"]
+    if (attempt >= 10 || !triggerWords.some((kw) => lastUserMessage.toLowerCase().includes(kw))) return
+
+    setTimeout(() => {
+      fetch(`/api/messages/${messageId}/products`, { credentials: "include" })
+        .then((response) => (response.ok ? response.json() : null))
+        .then((data) => {
+          if (!data) return
+          if (data.products && data.products.length > 0) {
+            const contentDiv = messageDiv.querySelector(".message-content")
+            const timestampDiv = contentDiv.querySelector(".message-timestamp")
+            contentDiv.insertBefore(createProductsContainer(data.products), timestampDiv)
+          } else if (data.pending) {
+            pollProducts(messageId, messageDiv, lastUserMessage, attempt + 1)
+          }
+        })
+        .catch((error) => console.error("Error fetching products:", error))
+    }, 500)
   }
 
   // Add typing indicator
@@ -827,6 +930,7 @@ function startChatFromManualInput() {
     localStorage.removeItem("currentSessionId")
 
     chatMessages.innerHTML = ""
+    messagesCursor = null
     userInput.value = ""
     sendBtn.disabled = true
 
@@ -905,56 +1009,12 @@ function startChatFromManualInput() {
       return
     }
 
-    fetch("/api/history", {
-      credentials: "include", // Important for auth cookies
-    })
-      .then((response) => {
-        if (!response.ok) {
-          if (response.status === 401) {
-            throw new Error("Authentication required")
-          }
-          throw new Error(`HTTP error! Status: ${response.status}`)
-        }
-        return response.json()
-      })
+    fetchHistoryPage(null)
       .then((data) => {
+        historyCursor = data.next_cursor || null
         if (data.sessions && data.sessions.length > 0) {
           historyList.innerHTML = ""
-
-          data.sessions.forEach((session) => {
-            const historyItem = document.createElement("div")
-            historyItem.className = "history-item"
-            if (session.id === currentSessionId) {
-              historyItem.classList.add("active")
-            }
-
-            const carDetails = document.createElement("div")
-            carDetails.className = "history-car-details"
-            carDetails.textContent = `${session.car_details.year} ${session.car_details.manufacturer} ${session.car_details.model}`
-
-            const lastMessage = document.createElement("div")
-            lastMessage.className = "history-last-message"
-            lastMessage.textContent = session.last_message
-
-            const historyDate = document.createElement("div")
-            historyDate.className = "history-date"
-
-            const date = new Date(session.created_at)
-            const formattedDate = `${date.toLocaleDateString()} ${date.toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" })}`
-
-            historyDate.innerHTML = `
-                        <span>${formattedDate}</span>
-                        <span>${session.message_count} messages</span>
-                    `
-
-            historyItem.appendChild(carDetails)
-            historyItem.appendChild(lastMessage)
-            historyItem.appendChild(historyDate)
-
-            historyItem.addEventListener("click", () => loadChatSession(session.id))
-
-            historyList.appendChild(historyItem)
-          })
+          data.sessions.forEach(addHistoryItem)
         } else {
           historyList.innerHTML = '<div class="history-empty">No past conversations found</div>'
         }
@@ -970,6 +1030,75 @@ function startChatFromManualInput() {
       })
   }
 
+  // Fetch one page of the history list, older than `cursor` when given
+  function fetchHistoryPage(cursor) {
+    const url = cursor ? `/api/history?before=${encodeURIComponent(cursor)}` : "/api/history"
+    return fetch(url, {
+      credentials: "include", // Important for auth cookies
+    }).then((response) => {
+      if (!response.ok) {
+        if (response.status === 401) {
+          throw new Error("Authentication required")
+        }
+        throw new Error(`HTTP error! Status: ${response.status}`)
+      }
+      return response.json()
+    })
+  }
+
+  // Load the next page of past conversations when the list is scrolled to the end
+  historyList.addEventListener("scroll", () => {
+    if (!historyCursor || loadingOlder) return
+    if (historyList.scrollTop + historyList.clientHeight < historyList.scrollHeight - 100) return
+
+    loadingOlder = true
+    fetchHistoryPage(historyCursor)
+      .then((data) => {
+        historyCursor = data.next_cursor || null
+        data.sessions.forEach(addHistoryItem)
+      })
+      .catch((error) => console.error("Error loading more history:", error))
+      .finally(() => {
+        loadingOlder = false
+      })
+  })
+
+  // Add one past conversation to the history list
+  function addHistoryItem(session) {
+    const historyItem = document.createElement("div")
+    historyItem.className = "history-item"
+    if (session.id === currentSessionId) {
+      historyItem.classList.add("active")
+    }
+
+    const carDetails = document.createElement("div")
+    carDetails.className = "history-car-details"
+    carDetails.textContent = `${session.car_details.year} ${session.car_details.manufacturer} ${session.car_details.model}`
+
+    const lastMessage = document.createElement("div")
+    lastMessage.className = "history-last-message"
+    lastMessage.textContent = session.last_message
+
+    const historyDate = document.createElement("div")
+    historyDate.className = "history-date"
+
+    const date = new Date(session.created_at)
+    const formattedDate = `${date.toLocaleDateString()} ${date.toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" })}`
+
+    historyDate.innerHTML = `
+                <span>${formattedDate}</span>
+                <span>${session.message_count} messages</span>
+            `
+
+    historyItem.appendChild(carDetails)
+    historyItem.appendChild(lastMessage)
+    historyItem.appendChild(historyDate)
+
+    historyItem.addEventListener("click", () => loadChatSession(session.id))
+
+    historyList.appendChild(historyItem)
+  }
+
   // Load chat session
   function loadChatSession(sessionId) {
     // Check if user is authenticated
@@ -1006,6 +1135,7 @@ function startChatFromManualInput() {
         chatTitleText.textContent = `${selectedYear} ${selectedManufacturer} ${selectedModel}`
 
         chatMessages.innerHTML = ""
+        messagesCursor = data.next_cursor || null
 
         data.messages.forEach((msg) => {
           addMessage(msg.role, msg.content, new Date(msg.timestamp), msg.car_image || null, msg.products || null)
@@ -1037,6 +1167,66 @@ function startChatFromManualInput() {
       })
   }
 
+  // Fetch one page of a conversation's messages, older than `cursor` when given
+  function fetchSessionPage(sessionId, cursor, limit = null) {
+    const params = new URLSearchParams()
+    if (cursor) params.set("before", cursor)
+    if (limit) params.set("limit", limit)
+    const query = params.toString()
+    return fetch(`/api/history/${sessionId}${query ? `?${query}` : ""}`, {
+      credentials: "include", // Important for auth cookies
+    }).then((response) => {
+      if (!response.ok) {
+        if (response.status === 401) {
+          throw new Error("Authentication required")
+        }
+        throw new Error(`HTTP error! Status: ${response.status}`)
+      }
+      return response.json()
+    })
+  }
+
+  // Fetch a conversation with all of its messages, following the page cursors
+  async function fetchWholeSession(sessionId) {
+    const data = await fetchSessionPage(sessionId, null, 200)
+    let cursor = data.next_cursor
+    while (cursor) {
+      const older = await fetchSessionPage(sessionId, cursor, 200)
+      data.messages = older.messages.concat(data.messages)
+      cursor = older.next_cursor
+    }
+    return data
+  }
+
+  // Load earlier messages when the conversation is scrolled to the top,
+  // keeping the visible messages in place
+  chatMessages.addEventListener("scroll", () => {
+    if (!messagesCursor || loadingOlder || chatMessages.scrollTop > 100) return
+
+    const sessionId = currentSessionId
+    loadingOlder = true
+    fetchSessionPage(sessionId, messagesCursor)
+      .then((data) => {
+        if (sessionId !== currentSessionId) return
+        messagesCursor = data.next_cursor || null
+
+        const previousHeight = chatMessages.scrollHeight
+        const previousTop = chatMessages.scrollTop
+        const firstMessage = chatMessages.firstChild
+        data.messages.forEach((msg) => {
+          const messageDiv = addMessage(
+            msg.role, msg.content, new Date(msg.timestamp), msg.car_image || null, msg.products || null,
+          )
+          chatMessages.insertBefore(messageDiv, firstMessage)
+        })
+        chatMessages.scrollTop = previousTop + chatMessages.scrollHeight - previousHeight
+      })
+      .catch((error) => console.error("Error loading earlier messages:", error))
+      .finally(() => {
+        loadingOlder = false
+      })
+  })
+
   // Handle image upload
   function handleImageUpload() {
     if (!currentSessionId || !imageUpload.files || !imageUpload.files[0]) {
@@ -1228,18 +1418,7 @@ function startChatFromManualInput() {
       return
     }
 
-    fetch(`/api/history/${currentSessionId}`, {
-      credentials: "include", // Important for auth cookies
-    })
-      .then((response) => {
-        if (!response.ok) {
-          if (response.status === 401) {
-            throw new Error("Authentication required")
-          }
-          throw new Error(`HTTP error! Status: ${response.status}`)
-        }
-        return response.json()
-      })
+    fetchWholeSession(currentSessionId)
       .then((data) => {
         let exportText = `Chat History - ${data.car_details.year} ${data.car_details.manufacturer} ${data.car_details.model}\n`
         exportText += `User: ${currentUser.name}\n`
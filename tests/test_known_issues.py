@@ -0,0 +1,34 @@
+import pytest
+
+from app.llm.known_issues import KnownIssuesIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    return KnownIssuesIndex.load()
+
+
+@pytest.mark.parametrize("text", [
+    "I have problems with my car, the engine overheats on the highway",
+    "Is this a known issue? my car stalls at idle",
+])
+def test_symptom_reports_are_not_known_issue_questions(index, text):
+    assert not index.is_known_issue_question(text)
+
+
+@pytest.mark.parametrize("text", [
+    "What are the common problems for this model?",
+    "What are the known issues with my car",
+])
+def test_known_issue_questions(index, text):
+    assert index.is_known_issue_question(text)
+
+
+def test_match_finds_described_issue(index):
+    matches = index.match("Toyota", "Corolla", 2017, "jerking and shuddering when I accelerate")
+    assert matches and matches[0].issue.issue == "CVT Transmission Problems"
+
+
+@pytest.mark.parametrize("text", ["check", "tire", "I need to check the tire"])
+def test_match_ignores_single_filler_word(index, text):
+    assert index.match("Toyota", "Corolla", 2017, text) == []
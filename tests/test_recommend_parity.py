@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from app.recommend import index_artifact
+from app.recommend import recommend
+from app.recommend.inverted import InvertedIndex
+from app.recommend.store import top_k as top_k_positions
+from synthetic_catalog import CatalogGenerator
+
+PRODUCTS = 3000
+QUERIES = 200
+TOP_K = 5
+
+
+def exact_top_k(q, term_matrix, k):
+    sims = (q @ term_matrix).tocsr()
+    best = top_k_positions(sims.data, k)
+    return sims.indices[best], sims.data[best]
+
+
+def same_ranking(a_rows, a_scores, b_rows, b_scores, tol=1e-9) -> bool:
+    if len(a_rows) != len(b_rows) or not np.allclose(a_scores, b_scores, atol=tol):
+        return False
+    if not len(a_rows):
+        return True
+    # products tied with the k-th score within rounding may legitimately swap
+    cutoff = a_scores[-1] + tol
+    return set(a_rows[a_scores > cutoff]) == set(b_rows[b_scores > cutoff])
+
+
+@pytest.fixture(scope="module")
+def queries():
+    gen = CatalogGenerator(11)
+    return [gen.query() for _ in range(QUERIES)]
+
+
+@pytest.fixture(scope="module")
+def catalog_index(tmp_path_factory):
+    csv_path = tmp_path_factory.mktemp("catalog") / "products.csv"
+    CatalogGenerator(7).write_csv(str(csv_path), PRODUCTS)
+    saved = recommend.CSV_PATH, recommend._current_index
+    recommend.CSV_PATH = str(csv_path)
+    recommend._current_index = None
+    try:
+        recommend._swap(recommend._load_and_index_from_csv())
+        yield recommend._current_index
+    finally:
+        recommend.CSV_PATH, recommend._current_index = saved
+
+
+def test_inverted_search_matches_exact_scoring(catalog_index, queries):
+    term_matrix = catalog_index.term_matrix
+    inverted = InvertedIndex(term_matrix)
+    qm = catalog_index.vectorizer.transform([recommend._prepare_query(text) for text, _ in queries])
+    qm.sort_indices()
+    for i in range(qm.shape[0]):
+        e_rows, e_scores = exact_top_k(qm[i], term_matrix, TOP_K)
+        start, end = qm.indptr[i], qm.indptr[i + 1]
+        i_rows, i_scores = inverted.search(qm.indices[start:end], qm.data[start:end], TOP_K)
+        assert same_ranking(e_rows, e_scores, i_rows, i_scores), f"query {i}"
+
+
+def _ids(results):
+    return [[p["id"] for p in products] for products in results]
+
+
+@pytest.mark.parametrize("scoped", [False, True])
+def test_score_queries_engines_agree(catalog_index, queries, scoped):
+    texts = [text for text, _ in queries]
+    vehicles = [vehicle for _, vehicle in queries] if scoped else None
+    exact = recommend.score_queries(texts, top_k=TOP_K, vehicles=vehicles, engine="exact")
+    inverted = recommend.score_queries(texts, top_k=TOP_K, vehicles=vehicles, engine="inverted")
+    assert _ids(exact) == _ids(inverted)
+    assert any(exact)
+
+
+def test_partition_cache_eviction_keeps_results(catalog_index, queries, monkeypatch):
+    texts = [text for text, _ in queries]
+    vehicles = [vehicle for _, vehicle in queries]
+    cached = recommend.score_queries(texts, top_k=TOP_K, vehicles=vehicles, engine="exact")
+
+    monkeypatch.setattr(recommend, "PARTITION_CACHE_BYTES", 1)
+    catalog_index._partitions.clear()
+    catalog_index._partitions_bytes = 0
+    evicted_before = catalog_index.partition_evictions
+    evicting = recommend.score_queries(texts, top_k=TOP_K, vehicles=vehicles, engine="exact")
+
+    assert catalog_index.partition_evictions > evicted_before
+    assert len(catalog_index._partitions) == 1
+    assert _ids(evicting) == _ids(cached)